@@ -1,16 +1,40 @@
+import sys
+
+# outside utils, whose imports would come before the greenlet servers patch the standard library
+from config import Config
+
+config = Config()
+
+if config.workers and config.worker_of is None:
+    # ingest process of the multi process mode, clients are served by the worker processes it starts
+    from models import run_ingest
+
+    run_ingest(config)
+    sys.exit()
+
+# greenlet servers need the standard library patched before the server and receiver create sockets and threads
+if config.async_mode == 'eventlet':
+    import eventlet
+
+    eventlet.monkey_patch()
+elif config.async_mode == 'gevent':
+    from gevent import monkey
+
+    monkey.patch_all()
+
 import json
 import os
 import signal
 import threading
 import time
 
-from flask import Flask, request, send_file, Response
+from flask import Flask, request, send_file, Response, stream_with_context
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS, cross_origin
 
-from models import MqttReceiver
+from models import MqttReceiver, Replay, WorkerReceiver
 
-from utils import Config
+from utils import dump_data, ENCODERS, EXPORT_FORMATS, EXPORT_MIMETYPES, serve_reusing_port
 
 app = Flask(__name__)
 
@@ -22,29 +46,64 @@ if not os.path.isdir('profiles'):
 
 app.config['SECRET_KEY'] = 'secret!'
 socketio = SocketIO(app, cors_allowed_origins=['http://localhost', 'http://localhost:5173', 'http://192.168.1.0'],
-                    async_mode='threading')
+                    async_mode=config.async_mode,
+                    # polling requests of one client may reach different workers, a websocket stays on one
+                    transports=['websocket'] if config.worker_of else ['polling', 'websocket'])
 cors = CORS(app)
 app.config['CORS_HEADERS'] = 'Content-Type'
 
-config = Config()
-
-receiver = MqttReceiver(
-    config.receiver_config,
-    config.mqtt_host,
-    config.mqtt_port,
-    config.mqtt_topic,
-    config.status_app)
+if config.worker_of:
+    receiver = WorkerReceiver(config.receiver_config, config.worker_of)
+else:
+    receiver = MqttReceiver(
+        config.receiver_config,
+        config.mqtt_host,
+        config.mqtt_port,
+        config.mqtt_topic,
+        config.status_app,
+        config.profiles_config,
+        connect=not config.replay)
 
 socketio.start_background_task(receiver.infinite_sender, socketio)
 
+if config.replay and not config.worker_of:
+    Replay(receiver, config.replay, config.replay_speed).start()
+
 
 @app.route('/data')
 @cross_origin()
 def get_data():
     """
-    :return: all data
+    :return: all data, streamed one chunk of samples at a time
+    """
+    return Response(stream_with_context(dump_data(receiver.data)), mimetype='application/json')
+
+
+@app.route('/data/range')
+@cross_origin()
+def get_data_range():
     """
-    return json.dumps(receiver.data, default=vars)
+    Query parameters: origin, keys (comma separated), start and end (timestamps, optional),
+    points (max points per key, 0 for all samples), format (json, csv or binary)
+
+    :return: columnar samples of keys with start < timestamp <= end, streamed key by key
+    """
+    origin = request.args.get('origin')
+    keys = [key for key in request.args.get('keys', '').split(',') if key]
+    output_format = request.args.get('format', 'json')
+    if origin is None or not keys:
+        return Response("origin and keys are required", 400)
+    if output_format not in EXPORT_FORMATS:
+        return Response(f"format has to be one of {', '.join(EXPORT_FORMATS)}", 400)
+    try:
+        start = float(request.args.get('start', '-inf'))
+        end = float(request.args.get('end', 'inf'))
+        points = int(request.args.get('points', 1000))
+    except ValueError as e:
+        return Response(f"Wrong range: {e}", 400)
+
+    columns = receiver.get_range_columns(origin, keys, start, end, points)
+    return Response(stream_with_context(ENCODERS[output_format](columns)), mimetype=EXPORT_MIMETYPES[output_format])
 
 
 @app.route('/charts/origins')
@@ -56,6 +115,61 @@ def get_origins():
     return json.dumps(receiver.get_origins())
 
 
+@app.route('/stats/ingest')
+@cross_origin()
+def get_ingest_stats():
+    """
+    :return: ingest queue depth, batch size and drop counters
+    """
+    return json.dumps(receiver.get_ingest_stats())
+
+
+@app.route('/stats/stages')
+@cross_origin()
+def get_stage_stats():
+    """
+    :return: count, total, mean and max duration of processing stages
+    """
+    return json.dumps(receiver.get_stage_stats())
+
+
+@app.route('/stats/status')
+@cross_origin()
+def get_status_stats():
+    """
+    :return: status app poll, emit and error counters
+    """
+    return json.dumps(receiver.get_status_stats())
+
+
+@app.route('/stats/clients')
+@cross_origin()
+def get_client_stats():
+    """
+    :return: sent, pending and dropped stale frames of client outboxes, of this process in the multi process mode
+    """
+    return json.dumps(receiver.get_client_stats())
+
+
+@app.route('/stats/emit')
+@cross_origin()
+def get_emit_stats():
+    """
+    :return: interval, ticks, overruns, skipped deadlines and max lateness of emit streams,
+     of this process in the multi process mode
+    """
+    return json.dumps(receiver.scheduler.stats())
+
+
+@app.route('/stats/workers')
+@cross_origin()
+def get_worker_stats():
+    """
+    :return: hub counters and sessions of every worker process in the multi process mode
+    """
+    return json.dumps(receiver.get_worker_stats())
+
+
 @app.route('/maps')
 @cross_origin()
 def get_maps():
@@ -97,9 +211,8 @@ def profiles(pars):
 
 @socketio.on('charts/configure')
 def configure_session(data):
-    session = receiver.get_session(request.sid)
     try:
-        session.configure(data)
+        receiver.configure_session(request.sid, data)
     except Exception as e:
         print(e)
 
@@ -109,7 +222,7 @@ def configure_maps(data):
     session_id = request.sid
     session = receiver.get_session(session_id)
     try:
-        history = session.configure_locations(data, receiver.location_history)
+        history = receiver.configure_locations(session, data)
         socketio.emit('maps/history', history, to=session_id)
     except Exception as e:
         print(e)
@@ -122,32 +235,55 @@ def get_origins(value):
         socketio.emit('charts/origins', receiver.get_origins(), to=session_id)
     if value == 'maps/origins':
         socketio.emit('maps/origins', receiver.get_location_origins(), to=session_id)
+    if value == 'raw/data':
+        socketio.emit('raw/data', receiver.get_raw_values(), to=session_id)
+    if value == 'profiles':
+        receiver.emit_profiles(session_id)
+    if value == 'statuses/data':
+        receiver.emit_status(session_id)
 
 
 @socketio.on('connect')
 def my_connect():
     receiver.create_session(request.sid)
+    socketio.emit('raw/data', receiver.get_raw_values(), to=request.sid)
+    receiver.emit_profiles(request.sid)
+    receiver.emit_status(request.sid)
 
 
 @socketio.on('disconnect')
 def my_disconnect():
-    receiver.sessions.pop(request.sid)
+    receiver.remove_session(request.sid)
 
 
 print(config)
 
 if __name__ == '__main__':
-    socketio_thread = threading.Thread(
-        target=socketio.run,
-        args=(app,),
-        kwargs={"debug": False, "host": "0.0.0.0", "port": config.pcc_port, "allow_unsafe_werkzeug": True},
-        daemon=True)
-    socketio_thread.start()
-
+    if not config.worker_of:
+        # stopped like by ctrl+c, so the recorder writes samples it did not flush yet
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
-        while True:
-            input()
-    except KeyboardInterrupt:
-        print("Wyłączanie")
-
-        os.kill(os.getpid(), signal.SIGINT)
+        if config.worker_of:
+            # workers share the port, connections are balanced between them by the kernel
+            serve_reusing_port(app, "0.0.0.0", config.pcc_port, config.async_mode)
+        elif config.async_mode != 'threading':
+            # greenlet servers run in the main thread until interrupted
+            socketio.run(app, host="0.0.0.0", port=config.pcc_port)
+        else:
+            socketio_thread = threading.Thread(
+                target=socketio.run,
+                args=(app,),
+                kwargs={"debug": False, "host": "0.0.0.0", "port": config.pcc_port, "allow_unsafe_werkzeug": True},
+                daemon=True)
+            socketio_thread.start()
+
+            try:
+                while True:
+                    input()
+            except KeyboardInterrupt:
+                print("Wyłączanie")
+
+                os.kill(os.getpid(), signal.SIGINT)
+    finally:
+        if receiver.recorder is not None:
+            receiver.recorder.stop()
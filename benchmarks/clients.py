@@ -0,0 +1,122 @@
+import argparse
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+# websocket-client, installed from requirements-optional.txt
+import websocket
+
+parser = argparse.ArgumentParser(description="Connects dashboard clients to a running server and measures chart frames")
+parser.add_argument("--url", default="http://localhost:2137")
+parser.add_argument("--clients", type=int, default=120)
+parser.add_argument("--slow", type=int, default=5, help="clients reading one packet every --slow-delay seconds")
+parser.add_argument("--slow-delay", type=float, default=1.0)
+parser.add_argument("--duration", type=float, default=20)
+parser.add_argument("--origin", default="20")
+parser.add_argument("--keys", default="cpuTemperature.value")
+parser.add_argument("--interval", type=float, default=0.5, help="chart interval requested by every client")
+parser.add_argument("--points", type=int, default=200)
+parser.add_argument("--origin-header", default="http://localhost", help="one of the server's allowed cors origins")
+
+
+def configuration(args):
+    return {
+        'origins': {args.origin: args.keys.split(',')},
+        'timeframe': 60,
+        'points': args.points,
+        'interval': args.interval,
+    }
+
+
+class Client:
+    """
+    Raw engine.io websocket client counting chart frames without decoding them, so one load generator process
+    can drive many clients. Slow clients have a small receive buffer and read one packet every delay seconds,
+    so the server's writes to them stall like to a browser on a bad link.
+    """
+
+    def __init__(self, args, delay=0.0):
+        self.args = args
+        self.delay = delay
+        self.frames = []
+        self.ws = None
+        self.running = True
+
+    def connect(self):
+        url = urlparse(self.args.url)
+        sockopt = ((socket.SOL_SOCKET, socket.SO_RCVBUF, 4096),) if self.delay else ()
+        self.ws = websocket.create_connection(
+            f"ws://{url.netloc}/socket.io/?EIO=4&transport=websocket", origin=self.args.origin_header,
+            sockopt=sockopt, timeout=30, skip_utf8_validation=True)
+        self.ws.recv()
+        self.ws.send('40')
+        self.ws.recv()
+        self.ws.send('42' + json.dumps(['charts/configure', configuration(self.args)]))
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while self.running:
+            if self.delay:
+                time.sleep(self.delay)
+            try:
+                packet = self.ws.recv()
+            except Exception:
+                return
+            if packet == '2':
+                self.ws.send('3')
+            elif packet.startswith('42["charts/'):
+                self.frames.append(time.monotonic())
+
+    def disconnect(self):
+        self.running = False
+        self.ws.close(timeout=0)
+
+    def rate(self, start, end):
+        return len([t for t in self.frames if start <= t < end]) / (end - start)
+
+
+def main():
+    args = parser.parse_args()
+    clients = [Client(args, args.slow_delay if i < args.slow else 0) for i in range(args.clients)]
+    for client in clients:
+        client.connect()
+    print(f"connected {len(clients)} clients, {args.slow} slow")
+
+    # skip the first seconds while clients configure
+    start = time.monotonic() + 2
+    time.sleep(args.duration)
+    end = time.monotonic()
+
+    expected = 1 / args.interval
+    for name, group in [('normal', clients[args.slow:]), ('slow', clients[:args.slow])]:
+        if not group:
+            continue
+        rates = np.array([client.rate(start, end) for client in group])
+        gaps = np.concatenate([np.diff([t for t in client.frames if start <= t < end]) for client in group])
+        print(f"{name:>6} clients: {np.min(rates):6.2f} / {np.median(rates):6.2f} / {np.max(rates):6.2f} "
+              f"frames/s min/median/max (requested {expected:.1f})")
+        if len(gaps):
+            print(f"{'':>6}  frame gap p50 {np.percentile(gaps, 50) * 1000:7.1f} ms, "
+                  f"p99 {np.percentile(gaps, 99) * 1000:7.1f} ms, max {np.max(gaps) * 1000:7.1f} ms")
+
+    outboxes = requests.get(f"{args.url}/stats/clients").json().values()
+    streams = [stream for name, stream in requests.get(f"{args.url}/stats/emit").json().items()
+               if name.startswith('charts/')]
+    print(f"server: {sum(outbox['sent'] for outbox in outboxes)} frames sent, "
+          f"{sum(outbox['stale'] for outbox in outboxes)} stale frames dropped, "
+          f"{sum(outbox['resyncs'] for outbox in outboxes)} resyncs, "
+          f"{sum(stream['overruns'] for stream in streams)} chart tick overruns")
+    workers = requests.get(f"{args.url}/stats/workers").json().get('workers', {})
+    if workers:
+        sessions = ', '.join(str(worker['sessions']) for worker in workers.values())
+        print(f"{len(workers)} workers with {sessions} sessions, server counters above are of one of them")
+    for client in clients:
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    main()
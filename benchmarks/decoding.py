@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils import parse_dict, loads, ShapeFlattener, JSON_BACKEND
+
+MESSAGES = 100000
+
+
+def build_payloads():
+    payloads = []
+    for i in range(MESSAGES):
+        message = {
+            'header': {'origin': 30, 'timestamp': {'high': 395, 'low': i, 'unsigned': True}},
+            'data': {
+                'battery_3v3': {'raw': i, 'scaled': i / 1000},
+                'switches': {'value': i % 16},
+                'pressure': {f"sensor{n}": {'raw': i + n, 'scaled': (i + n) / 10} for n in range(8)},
+                'location': {'latitude': 50 + i / 1e6, 'longitude': 20 + i / 1e6, 'height': 100},
+            }
+        }
+        payloads.append(json.dumps(message).encode())
+    return payloads
+
+
+def previous(payloads):
+    for payload in payloads:
+        message = json.loads(payload)
+        parse_dict(message['data'])
+
+
+def current(payloads):
+    flattener = ShapeFlattener()
+    for payload in payloads:
+        message = loads(payload)
+        flattener.flatten(str(message['header']['origin']), message['data'])
+
+
+def run(function, payloads):
+    start = time.perf_counter()
+    function(payloads)
+    return len(payloads) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    payloads = build_payloads()
+    print(f"decoding {MESSAGES} messages")
+    print(f"json.loads + parse_dict:               {run(previous, payloads):10.0f} messages/s")
+    print(f"{JSON_BACKEND} + ShapeFlattener:{' ' * (22 - len(JSON_BACKEND))}{run(current, payloads):10.0f} messages/s")
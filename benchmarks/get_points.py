@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from models.session import Session
+from utils import TimeSeries
+
+RATE = 100
+TIMEFRAME = 10
+TICKS = 20
+
+
+def build_data(history):
+    series = TimeSeries(history)
+    rng = np.random.default_rng(0)
+    for i, value in enumerate(rng.normal(size=history).tolist()):
+        series.append(i / RATE, value)
+    return {'origin': {'key': series}}
+
+
+def run(history):
+    data = build_data(history)
+    session = Session('benchmark')
+    session.configure({'origins': {'origin': ['key']}, 'timeframe': TIMEFRAME, 'points': 500})
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        session.get_points(data)
+    return (time.perf_counter() - start) / TICKS
+
+
+if __name__ == '__main__':
+    print(f"get_points per tick, {TIMEFRAME} s window at {RATE} Hz")
+    for history in [10 ** 4, 10 ** 5, 10 ** 6]:
+        print(f"history {history:>8} samples: {run(history) * 1000:8.2f} ms")
@@ -1,2 +1,5 @@
 from .mqtt_receiver import MqttReceiver
 from .session import Session
+from .replay import Replay
+from .worker_hub import WorkerHub, run_ingest
+from .worker_receiver import WorkerReceiver
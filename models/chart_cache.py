@@ -0,0 +1,28 @@
+class ChartCache:
+    """
+    Chart series computed during a sender tick, shared by all sessions asking for the same series.
+    Entries not requested since the previous evict are dropped by evict.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cache_key, compute, *args):
+        self.used.add(cache_key)
+        value = self.entries.get(cache_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute(*args)
+        self.entries[cache_key] = value
+        return value
+
+    def evict(self):
+        for cache_key in list(self.entries.keys()):
+            if cache_key not in self.used:
+                self.entries.pop(cache_key)
+        self.used = set()
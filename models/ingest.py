@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+
+
+class IngestQueue:
+    """
+    Bounded queue between the mqtt network thread and worker threads applying messages in batches.
+    Messages arriving while the queue is full are dropped and counted.
+    """
+
+    def __init__(self, handler, queue_size=10000, batch_size=100, workers=1):
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.running = False
+
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.max_queue_depth = 0
+
+    def put(self, message, block=False):
+        """
+        :param block: wait for free space instead of dropping the message when the queue is full
+        """
+        self.received += 1
+        try:
+            self.queue.put(message, block)
+        except queue.Full:
+            self.dropped += 1
+            return
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def start(self):
+        self.running = True
+        for i in range(self.workers):
+            threading.Thread(target=self.run, name=f"ingest-{i}", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def get_batch(self, timeout=0.5):
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while self.running:
+            batch = self.get_batch()
+            if not batch:
+                continue
+            try:
+                self.handler(batch)
+            except Exception as e:
+                print(f"failed to process batch: {e}")
+            self.processed += len(batch)
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            if len(batch) > self.max_batch_size:
+                self.max_batch_size = len(batch)
+
+    def join(self, timeout=None):
+        """
+        Wait until the queue is empty
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.processed + self.dropped < self.received:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def stats(self):
+        return {
+            'queueDepth': self.queue.qsize(),
+            'maxQueueDepth': self.max_queue_depth,
+            'queueSize': self.queue.maxsize,
+            'received': self.received,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'batches': self.batches,
+            'lastBatchSize': self.last_batch_size,
+            'maxBatchSize': self.max_batch_size,
+        }
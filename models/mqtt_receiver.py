@@ -1,268 +1,335 @@
-import json
 import threading
-import time
-from copy import deepcopy
+from time import perf_counter
+from collections import deque
 
-import requests
 from flask_socketio import SocketIO
 
 import paho.mqtt.client as mqtt
-from time import perf_counter
 
-from .profiles_handler import ProfilesHandler
-from .session import Session
-from utils import js_long_to_date, DataPoint, parse_dict, check_location_difference
+from .profiles_watcher import ProfilesWatcher
+from .ingest import IngestQueue
+from .receiver import Receiver
+from .recorder import Recorder
+from .snapshot import Snapshot, publish_raw_values
+from .status_poller import StatusPoller
+from utils import check_location_difference, TimeSeries, SharedTimeSeries, DISTANCE_MODES, PayloadDecoder
+
 
+class MqttReceiver(Receiver):
+    """
+    :param shared: keep series in shared memory for worker processes serving the clients, the receiver then
+     does not emit to clients itself
+    """
 
-class MqttReceiver:
     def __init__(self, config='app_config.json', host='localhost', port=1883, topic='pcc/in',
-                 status_application='http://localhost:2138/', profiles_config='profiles-config.json'):
-        self.running = True
+                 status_application='http://localhost:2138/', profiles_config='profiles-config.json', connect=True,
+                 shared=False):
+        super().__init__(config)
+        self.connect = connect
+        self.shared = shared
         self.status_application = status_application
 
-        with open(config, encoding='utf-8') as f:
-            self.config = json.loads(f.read())
+        storage_config = self.config.get('storage', {})
+        self.series_capacity = storage_config.get('capacity', 100000)
+        self.series_retention = storage_config.get('retention')
+        self.series_rollups = storage_config.get('rollups', [])
+        self.series_rollup_capacity = storage_config.get('rollupCapacity', 10000)
+        self.series_shared_guard = storage_config.get('sharedGuard', 1000)
+        locations_config = self.config.get('locations', {})
+        self.location_history_length = locations_config.get('historyLength', 100000)
+        self.trail_resolution = locations_config.get('trailResolution', 5)
+        self.distance_mode = locations_config.get('distance', 'equirectangular')
+        if self.distance_mode not in DISTANCE_MODES:
+            raise ValueError(f"Unknown distance mode {self.distance_mode}, available modes: {DISTANCE_MODES}")
+        status_config = self.config.get('status', {})
+        self.status_poller = StatusPoller(
+            status_application,
+            status_config.get('interval', 0.2),
+            status_config.get('timeout', 2.0),
+            status_config.get('backoff', 0.5),
+            status_config.get('maxBackoff', 30.0))
+        ingest_config = self.config.get('ingest', {})
+        # messages are applied to series and state of the receiver without locking, in timestamp order
+        if ingest_config.get('workers', 1) != 1:
+            raise ValueError("Messages are applied by a single ingest worker, ingest.workers has to be 1")
+        self.ingest = IngestQueue(
+            self.recieve_messages,
+            ingest_config.get('queueSize', 10000),
+            ingest_config.get('batchSize', 100))
+
+        recording_config = self.config.get('recording', {})
+        if recording_config.get('enabled', False):
+            self.recorder = Recorder(
+                recording_config.get('directory', 'recordings'),
+                recording_config.get('segmentSize', 64 * 1024 * 1024),
+                recording_config.get('segmentDuration', 3600),
+                recording_config.get('flushInterval', 1.0),
+                recording_config.get('payloads', False))
+
         self.client = mqtt.Client()
 
         self.topics = []
-        self.client.on_message = self.recieve_message
+        self.client.on_message = self.enqueue_message
+
+        topics = [topic, *self.config.get('topics', {}).keys()]
 
         def on_client_connect(client, *args, **kwargs):
-            print(f'Connecting to topic {topic}')
-            client.subscribe(topic)
+            for name in topics:
+                print(f'Connecting to topic {name}')
+                client.subscribe(name)
 
         self.client.on_connect = on_client_connect
-        self.client.connect(host, port)
+        if connect:
+            self.client.connect(host, port)
+
+        self.decoder = PayloadDecoder(self.config.get('origins', {}), self.config.get('topics', {}))
+
+        # state owned by the ingest thread, readers use snapshot published from it after every batch
+        self._data = {}
+        self._raw_values = {}
+        self._locations = {}
+        self._trail_points = {}
+        self._location_history = {}
+        # origin -> raw value keys changed since the last publish
+        self._raw_changes = {}
+        # snapshot fields changed since the last publish
+        self._changed = set()
+        # origin -> locations added to its history since the last publish
+        self._history_added = {}
+        # a shared series got guard samples since the last publish, which has to come before it gets more
+        self._share_due = False
+        # origin -> number of locations ever added to its history, updated with the history under history_lock
+        self._history_totals = {}
+        # called with the previous snapshot, the published one and origin -> (history total, added locations)
+        self.publish_listeners = []
 
-        self.socketio = None
-        self.last_message_times = dict()
-
-        self.data = {}
-        self.locations = {}
-        self.location_history = {}
-        self.origins_changed = False
-
-        self.location_origins_changed = False
-        self.last_trail_points = {}
-        self.changed_trail_points = []
-
-        self.sessions = {}
-        self.raw_values = {}
         self.profiles_config = profiles_config
-        self.profiles_handlers = None
+        self.profiles = None
 
         self.run_forever()
 
     def infinite_sender(self, socketio: SocketIO):
 
         self.socketio = socketio
+        threading.Thread(target=self.status_poller.run, args=(socketio, lambda: self.running),
+                         name="status", daemon=True).start()
+        profiles_watcher = None
         if self.profiles_config:
-            self.profiles_handlers = ProfilesHandler.get_handlers(self.profiles_config, socketio)
-
-        while self.running:
-
-            if self.profiles_handlers is not None:
-                for handler in self.profiles_handlers:
-                    handler.emit()
-            for session in self.sessions.values():
-                session.execute(self.data, socketio)
-
-            self.emit_raw_values(socketio)
-
-            for session in self.sessions.values():
-                session.send_locations(self.locations, socketio)
-            if len(self.changed_trail_points):
-                for session in self.sessions.values():
-                    session.send_trail_locations(self.last_trail_points, self.changed_trail_points, socketio)
-                self.changed_trail_points = []
-            time.sleep(0.5)
-
-            if self.origins_changed:
-                self.origins_changed = False
-                socketio.emit('charts/origins', self.get_origins())
-            if self.location_origins_changed:
-                self.location_origins_changed = False
-                socketio.emit('maps/origins', self.get_location_origins())
+            profiles_config = self.config.get('profiles', {})
+            profiles_watcher = ProfilesWatcher(
+                self.profiles_config, socketio,
+                profiles_config.get('emitInterval', 0.1),
+                profiles_config.get('reloadInterval', 1.0))
+
+        if profiles_watcher is not None:
+            self.scheduler.add('reload', profiles_watcher.poll_interval,
+                               lambda: self.reload_profiles(profiles_watcher, socketio))
+        self.scheduler.add('profiles', self.emit_intervals['profiles'], self.emit_profile_changes)
+        if not self.shared:
+            self.start_client_streams(socketio)
+        self.scheduler.run(lambda: self.running)
         print("Quitting receiver")
-        self.client.loop_stop()
-
-    def status_sender(self):
-        while self.running:
-            try:
-                response = requests.get(self.status_application)
-                if response.status_code == 200:
-                    self.socketio.emit('statuses/data', response.json())
-                    time.sleep(0.2)
-                    continue
-                raise ValueError('Received invalid status code')
-            except Exception as e:
-                print(e)
-                time.sleep(5)
+        if self.connect:
+            self.client.loop_stop()
+
+    def emit_profile_changes(self):
+        if self.profiles is not None:
+            for handler in self.profiles.handlers:
+                handler.emit(new=True)
+
+    def reload_profiles(self, profiles_watcher: ProfilesWatcher, socketio: SocketIO):
+        profiles = profiles_watcher.poll(self.profiles)
+        if profiles is None:
+            return
+        self.profiles = profiles
+        print(f"loaded profiles {[handler.profile_id for handler in profiles.handlers]}")
+        for handler in profiles.handlers:
+            handler.emit_snapshot()
 
     def run_forever(self):
-        ft = threading.Thread(target=self.client.loop_forever)
-        ft.start()
-        st = threading.Thread(target=self.status_sender)
-        st.start()
+        if self.recorder is not None:
+            self.recorder.start()
+        self.ingest.start()
+        if self.connect:
+            ft = threading.Thread(target=self.client.loop_forever)
+            ft.start()
+
+    def enqueue_message(self, _client, _userdata, msg: mqtt.MQTTMessage):
+        self.ingest.put(msg)
+
+    def recieve_messages(self, messages: list[mqtt.MQTTMessage]):
+        for msg in messages:
+            self.recieve_message(None, None, msg)
+        self.publish()
+        if self.profiles is not None:
+            for handler in self.profiles.handlers:
+                handler.emit(new=True)
 
     def recieve_message(self, _client, _userdata, msg: mqtt.MQTTMessage):
+        if self.recorder is not None:
+            self.recorder.record_payload(msg.topic, msg.payload)
+        start = perf_counter()
         try:
-            message = json.loads(msg.payload)
+            messages = self.decoder.decode(msg.topic, msg.payload)
         except Exception as e:
             print(f"Failed to decode message, exception: {e}, message: {msg.payload}")
             return
+        decoded = perf_counter()
+        for origin, timestamp, parsed in messages:
+            self.apply_message(origin, timestamp, parsed)
+        self.timer.add('decode', decoded - start)
+        self.timer.add('apply', perf_counter() - decoded, len(messages))
+
+    def apply_message(self, origin: str, timestamp: float, parsed: dict):
+        """
+        Applies message to the ingest state, it is visible to readers after the next publish.
+        """
         try:
-            header = message.get('header')
-            if not header:
-                return
-            origin = header.get('origin')
-            origin = str(origin)
-
-            last_message_time = self.last_message_times.get(origin, 0)
-            if perf_counter() - 0.1 < last_message_time :
-                return
-
-            self.last_message_times[origin] = perf_counter()
-            data = message.get('data')
-            if data is None or origin is None: return
-
-            timestamp = header.get('timestamp')
-            if not timestamp: return
-            high = timestamp.get('high')
-            low = timestamp.get('low')
-            signed = timestamp.get('unsigned')
-            if high is None or low is None or signed is None: return
-
-            timestamp = js_long_to_date(high, low, signed)
-            previous = self.data.get(origin)
+            previous = self._data.get(origin)
 
             if previous is None:
-                self.data[origin] = {}
-                self.origins_changed = True
-            parsed = parse_dict(data)
+                self._data[origin] = {}
+                self._changed.add('data')
             self.parse_locations(origin, parsed.items())
 
-            current_origin_value = self.raw_values.get(origin, {"name": origin, 'keys': {}})
-
+            current_origin_value = self._raw_values.get(origin)
+            if current_origin_value is None:
+                current_origin_value = {"name": origin, 'displayName': self.get_origin_display_name(origin), 'keys': {}}
+                self._raw_values[origin] = current_origin_value
             current_origin_value['timestamp'] = timestamp
-            current_origin_value['displayName'] = self.get_origin_display_name(origin)
+            origin_keys = current_origin_value['keys']
 
-            message_keys = []
+            # dict rather than set, keeps keys new to the origin in message order
+            raw_changes = self._raw_changes.setdefault(origin, {})
+            profiles = self.profiles
             for key, value in parsed.items():
                 if value is None:
                     continue
 
                 self.check_origin(origin, key)
                 if isinstance(value, int) or isinstance(value, float):
-                    self.data[origin][key].append(DataPoint(timestamp, value))
-                current_origin_value['keys'][key] = {'value': value}
-
-                message_keys.append(key)
-                if self.profiles_handlers is not None:
-                    for handler in self.profiles_handlers:
-                        handler.add_value(origin, key, value)
-
-            key_names = self.get_origin_keys_display_names(origin, message_keys)
-
-            for key in key_names:
-                key_name = key['name']
-                current_origin_value['keys'][key_name] = {**key, **current_origin_value['keys'][key_name]}
-            self.raw_values[origin] = current_origin_value
-            if self.profiles_handlers is not None:
-                for handler in self.profiles_handlers:
-                    handler.emit(new=True)
+                    series = self._data[origin][key]
+                    series.append(timestamp, value)
+                    if self.shared and series.needs_share():
+                        self._share_due = True
+                    if self.recorder is not None:
+                        self.recorder.record(origin, key, timestamp, value)
+
+                key_value = origin_keys.get(key)
+                if key_value is None:
+                    key_value = dict(self.get_key_display_name(origin, key))
+                    origin_keys[key] = key_value
+                key_value['value'] = value
+                raw_changes[key] = True
+
+                if profiles is not None:
+                    profiles.route(origin, key, value)
         except Exception as e:
             print(f"unsupported message: {e}")
-
-    def send_last_messages(self):
-        if self.socketio:
-            self.socketio.emit('raw/data', self.data)
-
-    def get_origin_display_name(self, origin: str):
-        origin_config = self.config.get('origins', {}).get(origin, {})
-        return origin_config.get('displayName', origin)
-
-    def get_origin_keys_display_names(self, origin: str, keys: list[str]):
-        origin_config = self.config.get('origins', {}).get(origin, {})
-        display_names = origin_config.get('keys', {})
-        return [{"name": key, "displayName": display_names.get(key, key)} for key in keys]
+        if self._share_due:
+            # workers read shared series only up to guard samples past the state they last refreshed
+            self.publish()
+
+    def publish(self) -> Snapshot:
+        """
+        Publishes ingest state changed since the previous snapshot as a new snapshot.
+        """
+        changed, self._changed = self._changed, set()
+        self._share_due = False
+        raw_changes, self._raw_changes = self._raw_changes, {}
+        history_added, self._history_added = self._history_added, {}
+        previous = self.snapshot
+        if not changed and not raw_changes:
+            return previous
+        self.snapshot = Snapshot(
+            previous.version + 1,
+            {origin: dict(keys) for origin, keys in self._data.items()} if 'data' in changed else previous.data,
+            publish_raw_values(previous.raw_values, self._raw_values, raw_changes),
+            dict(self._locations) if 'locations' in changed else previous.locations,
+            dict(self._trail_points) if 'trail' in changed else previous.trail_points,
+            dict(self._location_history) if 'history' in changed else previous.location_history)
+        if self.publish_listeners:
+            history = {origin: (self._history_totals[origin], locations) for origin, locations in history_added.items()}
+            for listener in self.publish_listeners:
+                listener(previous, self.snapshot, history)
+        return self.snapshot
 
     def parse_locations(self, origin: str, keys):
-        origin_location = self.locations.get(origin, {})
-        new_location = deepcopy(origin_location)
+        origin_location = self._locations.get(origin, {})
+        new_location = None
         for key, val in keys:
             if 'location' in key:
                 if key.endswith('longitude'):
-                    new_location['lng'] = val
-                    continue
-                if key.endswith('latitude'):
-                    new_location['lat'] = val
+                    field = 'lng'
+                elif key.endswith('latitude'):
+                    field = 'lat'
+                elif key.endswith('height'):
+                    field = 'alt'
+                else:
                     continue
-                if key.endswith('height'):
-                    new_location['alt'] = val
-                    continue
-        if not len(origin_location.items()):
-            self.location_origins_changed = True
+                if new_location is None:
+                    # published locations are never mutated, so readers can keep references to them
+                    new_location = dict(origin_location)
+                new_location[field] = val
 
+        if new_location is None:
+            return
         if new_location.get('lat') is not None and new_location.get('lng') is not None:
-            self.locations[origin] = new_location
-            last_trail = self.last_trail_points.get(origin, {})
-            if check_location_difference(last_trail, new_location, 5):
-                self.last_trail_points[origin] = new_location
+            self._locations[origin] = new_location
+            self._changed.add('locations')
+            last_trail = self._trail_points.get(origin, {})
+            if check_location_difference(last_trail, new_location, self.trail_resolution, self.distance_mode):
+                self._trail_points[origin] = new_location
+                self._changed.add('trail')
                 self.add_location_to_history(origin, new_location)
-                self.changed_trail_points.append(origin)
 
     def add_location_to_history(self, origin, location):
-        previous_locations = deepcopy(self.location_history.get(origin, []))
-
-        previous_locations.append(location)
-        self.location_history[origin] = previous_locations
-
-    def get_origins(self):
-        ret_list = []
-        for (origin, v) in self.data.items():
-            display_name = self.get_origin_display_name(origin)
-            keys = self.get_origin_keys_display_names(origin, v.keys())
-            ret_list.append(
-                {"name": origin, "displayName": display_name, "keys": keys})
-        return ret_list
-
-    def get_locations(self):
-        ret_data = {}
-        for origin, value in deepcopy(self.locations).items():
-            value["displayName"] = self.get_origin_display_name(origin)
-            ret_data[origin] = value
-        return ret_data
-
-    def create_session(self, session_name: str):
-        self.sessions[session_name] = Session(session_name)
-        return session_name
-
-    def get_session(self, session_name: str):
-        return self.sessions.get(session_name)
-
-    def remove_session(self, session_name: str):
-        session = self.get_session(session_name)
-        if not session:
-            return False
-        session.kill()
-        self.sessions.pop(session_name)
-
-    def get_location_origins(self):
-        origins_list = []
-        for origin in list(self.location_history.keys()):
-            origins_list.append({'name': origin, 'displayName': self.get_origin_display_name(origin)})
-        return origins_list
-
-    def emit_raw_values(self, socketio):
-        emit_value = {}
-        for key, value in self.raw_values.items():
-            new_value = {**value, 'keys': list(value.get('keys').values())}
-            emit_value[key] = new_value
-        socketio.emit('raw/data', emit_value)
+        with self.history_lock:
+            history = self._location_history.get(origin)
+            if history is None:
+                history = deque(maxlen=self.location_history_length)
+                self._location_history[origin] = history
+                self._changed.add('history')
+            history.append(location)
+            self._history_totals[origin] = self._history_totals.get(origin, 0) + 1
+        self._history_added.setdefault(origin, []).append(location)
+
+    def get_location_history(self):
+        """
+        :return: origin -> (number of locations ever added, kept locations), may include locations not published yet
+        """
+        with self.history_lock:
+            return {origin: (self._history_totals[origin], list(history))
+                    for origin, history in self._location_history.items()}
+
+    def emit_profiles(self, session_name: str):
+        if self.profiles is not None:
+            for handler in self.profiles.handlers:
+                handler.emit_snapshot(to=session_name)
+
+    def emit_status(self, session_name: str):
+        self.status_poller.emit_status(self.socketio, session_name)
+
+    def get_ingest_stats(self):
+        return self.ingest.stats()
+
+    def get_stage_stats(self):
+        return self.timer.stats()
+
+    def get_status_stats(self):
+        return self.status_poller.stats()
+
+    def get_worker_stats(self):
+        return {}
 
     def check_origin(self, origin, key):
-        previous_data_point = self.data[origin].get(key)
+        previous_data_point = self._data[origin].get(key)
         if previous_data_point is None:
-            self.data[origin][key] = []
-            self.origins_changed = True
+            if self.shared:
+                series = SharedTimeSeries(self.series_capacity, self.series_retention, self.series_rollups,
+                                          self.series_rollup_capacity, self.series_shared_guard)
+            else:
+                series = TimeSeries(self.series_capacity, self.series_retention, self.series_rollups,
+                                    self.series_rollup_capacity)
+            self._data[origin][key] = series
+            self._changed.add('data')
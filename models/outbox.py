@@ -0,0 +1,118 @@
+import threading
+from collections import deque
+
+from flask_socketio import SocketIO
+
+# frames superseded by the next frame of the same kind, only the newest pending one is kept
+CHART_EVENTS = ('charts/data', 'charts/delta')
+LATEST_EVENTS = ('maps/data',)
+
+
+def client_backlog(socketio: SocketIO, sid: str, namespace: str = '/') -> int:
+    """
+    :return: number of packets queued by the transport of client sid and not sent yet
+    """
+    try:
+        eio_sid = socketio.server.manager.eio_sid_from_sid(sid, namespace)
+        socket = socketio.server.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+    except Exception:
+        return 0
+
+
+class Outbox:
+    """
+    Bounded queue of events for one client, sent by its own background task so a slow client only delays itself.
+    The task waits while the transport of the client has more than backlog packets queued, meanwhile
+    stale chart frames are dropped: a pending full frame is replaced by a newer one, and a delta can not be
+    merged into a pending frame, so both are dropped and on_stale is called to resync the session.
+
+    Has the emit signature of SocketIO, so it can be passed wherever socketio is used to emit to one client.
+    """
+
+    def __init__(self, socketio: SocketIO, sid: str, size: int = 100, backlog: int = 2, on_stale=None):
+        self.socketio = socketio
+        self.sid = sid
+        self.size = size
+        self.backlog = backlog
+        self.on_stale = on_stale
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.running = False
+
+        self.sent = 0
+        self.stale = 0
+        self.resyncs = 0
+        self.overflows = 0
+
+    def emit(self, event: str, data, to: str = None):
+        on_stale = None
+        with self.condition:
+            if event in CHART_EVENTS or event in LATEST_EVENTS:
+                kind = CHART_EVENTS if event in CHART_EVENTS else (event,)
+                queued = next((item for item in self.pending if item[0] in kind), None)
+                if queued is not None:
+                    self.stale += 1
+                    if event == 'charts/delta':
+                        self.pending.remove(queued)
+                        self.stale += 1
+                        self.resyncs += 1
+                        on_stale = self.on_stale
+                    else:
+                        queued[0], queued[1] = event, data
+                    event = None
+            if event is not None:
+                if len(self.pending) >= self.size:
+                    self.overflows += 1
+                else:
+                    self.pending.append([event, data])
+            self.condition.notify()
+        if on_stale is not None:
+            on_stale()
+
+    def start(self):
+        self.running = True
+        self.socketio.start_background_task(self.run)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.pending.clear()
+            self.condition.notify()
+
+    def next(self):
+        """
+        :return: oldest pending [event, data] once the client transport has room for it, None when stopped
+        """
+        while self.running:
+            with self.condition:
+                if not self.pending:
+                    self.condition.wait(1.0)
+                    continue
+            if client_backlog(self.socketio, self.sid) > self.backlog:
+                self.socketio.sleep(0.01)
+                continue
+            with self.condition:
+                if self.pending:
+                    return self.pending.popleft()
+        return None
+
+    def run(self):
+        while self.running:
+            item = self.next()
+            if item is None:
+                return
+            try:
+                self.socketio.emit(item[0], item[1], to=self.sid)
+                self.sent += 1
+            except Exception as e:
+                print(f"Failed to send {item[0]} to {self.sid}: {e}")
+
+    def stats(self):
+        return {
+            'pending': len(self.pending),
+            'sent': self.sent,
+            'stale': self.stale,
+            'resyncs': self.resyncs,
+            'overflows': self.overflows,
+        }
@@ -1,64 +1,110 @@
 import json
-import os
-import signal
+import time
 
 
 def get_field_name(origin, field):
     return f"{origin}.{field}"
 
 
+class ProfilesConfigError(Exception):
+    pass
+
+
+def read_config_file(config_filename):
+    print(f"reading profiles config {config_filename}")
+    with open(config_filename) as profiles_config:
+        return json.loads(profiles_config.read())
+
+
 class ProfilesHandler:
-    def __init__(self, profile_id, socketio):
+    def __init__(self, profile_id, socketio, emit_interval=0.1):
         self.profile_id = profile_id
+        # field name -> entities of svg elements showing the field, values are updated in place
         self.values = {}
         self.socketio = socketio
-        self.should_be_emited = False
-
-    def add_entities(self, field, info):
-        self.values[field] = [{**element, "value": None} for element in info]
+        self.emit_interval = emit_interval
+        self.last_emit = float('-inf')
+        # field name -> entities changed since the last emit
+        self.changed = {}
+        # (origin, field) -> field name
+        self.fields = {}
+
+    def add_entities(self, origin, field, info):
+        field_name = get_field_name(origin, field)
+        self.fields[(origin, field)] = field_name
+        self.values[field_name] = [{**element, "value": None} for element in info]
 
     def add_value(self, origin, field, value):
-        field_name = get_field_name(origin, field)
+        self.set_value(get_field_name(origin, field), value)
+
+    def set_value(self, field_name, value):
         entities = self.values.get(field_name)
         if entities is None:
             return
 
-        self.should_be_emited = True
-        entities = [{**entity, 'value': value} for entity in entities]
-        self.values[field_name] = entities
+        for entity in entities:
+            entity['value'] = value
+        self.changed[field_name] = entities
 
     def emit(self, new: bool = False):
-        if not new or self.should_be_emited:
-            emit_data = []
-            for element in self.values.values():
-                emit_data.extend(element)
-            self.socketio.emit(f'profiles/{self.profile_id}', emit_data)
-        self.should_be_emited = False
+        """
+        :param new: emit only entities changed since the last emit, at most once per emit_interval,
+         otherwise emit all entities
+        """
+        if not new:
+            self.emit_snapshot()
+            return
+        now = time.perf_counter()
+        if not self.changed or now - self.last_emit < self.emit_interval:
+            return
+        changed, self.changed = self.changed, {}
+        emit_data = []
+        for entities in changed.values():
+            emit_data.extend(entities)
+        self.last_emit = now
+        self.socketio.emit(f'profiles/{self.profile_id}', emit_data)
+
+    def copy_values(self, other: 'ProfilesHandler'):
+        """
+        Take last values of fields that are also shown by other
+        """
+        for field_name, entities in self.values.items():
+            other_entities = other.values.get(field_name)
+            if not other_entities:
+                continue
+            for entity in entities:
+                entity['value'] = other_entities[0]['value']
+
+    def emit_snapshot(self, to=None):
+        emit_data = []
+        for element in list(self.values.values()):
+            emit_data.extend(element)
+        self.socketio.emit(f'profiles/{self.profile_id}', emit_data, to=to)
 
     @classmethod
-    def get_from_config(cls, config_filename, socketio, profile_handlers=None):
+    def get_from_config(cls, config_filename, socketio, profile_handlers=None, emit_interval=0.1, read_config=None):
+        """
+        :param read_config: function returning parsed config of a file, it's result is not modified
+        """
+        if read_config is None:
+            read_config = read_config_file
+        config = read_config(config_filename)
 
-        print(f"reading profiles config {config_filename}")
-        with open(config_filename) as profiles_config:
-            config = json.loads(profiles_config.read())
-
-        imports = config.pop('imports', [])
+        imports = config.get('imports', [])
 
         for filename in imports:
-            if not os.path.isfile(filename):
-                print(f"import {filename} in cofig {config_filename} not found, quitting")
-                os.kill(os.getpid(), signal.SIGINT)
-                return
-
             if filename==config_filename:
-                print(f"infinite import {filename} found, quitting")
-                os.kill(os.getpid(), signal.SIGINT)
-                return
-            profile_handlers = cls.get_from_config(filename, socketio, profile_handlers)
+                raise ProfilesConfigError(f"infinite import {filename} found")
+            try:
+                profile_handlers = cls.get_from_config(filename, socketio, profile_handlers, emit_interval, read_config)
+            except FileNotFoundError:
+                raise ProfilesConfigError(f"import {filename} in config {config_filename} not found")
         if profile_handlers is None:
             profile_handlers = {}
 
         for origin_name, fields in config.items():
+            if origin_name == 'imports':
+                continue
             if not isinstance(fields, dict):
                 raise ChildProcessError(
                     f"Invalid field type for origin {origin_name}. Field should be a dictionary and is {type(fields)}")
@@ -74,20 +120,46 @@ class ProfilesHandler:
                         if not isinstance(value, dict):
                             raise ChildProcessError(
                                 f"Invalid field type for profile {profile_name} key {field_name} origin {origin_name} value {i + 1}. Field should be a dictionary and is {type(fields)}")
-                    profile_handler = profile_handlers.get(profile_name, cls(profile_name, socketio))
+                    profile_handler = profile_handlers.get(profile_name, cls(profile_name, socketio, emit_interval))
 
-                    profile_handler.add_entities(get_field_name(origin_name, field_name), info)
+                    profile_handler.add_entities(origin_name, field_name, info)
                     profile_handlers[profile_name] = profile_handler
 
         return profile_handlers
 
 
     @classmethod
-    def get_handlers(cls, initial_config_filename, socketio):
+    def get_handlers(cls, initial_config_filename, socketio, emit_interval=0.1, read_config=None):
+        """
+        :param read_config: function returning parsed config of a file, passed to get_from_config
+        :raises ProfilesConfigError: if the config can not be read or is invalid
+        """
         try:
-            handlers = cls.get_from_config(initial_config_filename, socketio)
-            return list(handlers.values())
+            handlers = cls.get_from_config(initial_config_filename, socketio, emit_interval=emit_interval,
+                                           read_config=read_config)
+        except ProfilesConfigError:
+            raise
         except Exception as e:
-            print(f'failed to create profiles handler: {e}, quitting')
-            os.kill(os.getpid(), signal.SIGINT)
-            return []
\ No newline at end of file
+            raise ProfilesConfigError(f"failed to create profiles handlers from {initial_config_filename}: {e}")
+        return ProfilesRouting(list(handlers.values()))
+
+
+class ProfilesRouting:
+    """
+    Profiles handlers with an index of (origin, key) -> [(handler, field name)] of every field shown in a profile.
+    Built once and never modified, so it can be replaced with a single assignment.
+    """
+
+    def __init__(self, handlers: list[ProfilesHandler]):
+        self.handlers = handlers
+        self.routes = {}
+        for handler in handlers:
+            for origin_field, field_name in handler.fields.items():
+                self.routes.setdefault(origin_field, []).append((handler, field_name))
+
+    def route(self, origin, field, value):
+        routes = self.routes.get((origin, field))
+        if routes is None:
+            return
+        for handler, field_name in routes:
+            handler.set_value(field_name, value)
\ No newline at end of file
@@ -0,0 +1,72 @@
+import os
+import time
+
+from .profiles_handler import ProfilesHandler, ProfilesRouting, read_config_file
+
+
+class ProfilesWatcher:
+    """
+    Loads profiles config with its imports and reloads it when any of the files changes.
+    Parsed files are cached by modification time, so a reload parses only changed files.
+    """
+
+    def __init__(self, config_filename, socketio, emit_interval=0.1, poll_interval=1.0):
+        self.config_filename = config_filename
+        self.socketio = socketio
+        self.emit_interval = emit_interval
+        self.poll_interval = poll_interval
+        self.last_poll = 0
+        # filename -> (modification time, parsed config)
+        self.files = {}
+        # modification times of files read by the last load, None for files that could not be read
+        self.mtimes = {}
+
+    def get_mtime(self, filename):
+        try:
+            return os.path.getmtime(filename)
+        except OSError:
+            return None
+
+    def read(self, filename):
+        mtime = self.get_mtime(filename)
+        self.mtimes[filename] = mtime
+        cached = self.files.get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        config = read_config_file(filename)
+        self.files[filename] = (mtime, config)
+        return config
+
+    def load(self) -> ProfilesRouting:
+        self.mtimes = {}
+        return ProfilesHandler.get_handlers(self.config_filename, self.socketio, self.emit_interval, self.read)
+
+    def changed(self) -> bool:
+        if not self.mtimes:
+            return True
+        return any(self.get_mtime(filename) != mtime for filename, mtime in self.mtimes.items())
+
+    def poll(self, current: ProfilesRouting = None):
+        """
+        :return: new profiles if config files changed since the last load and they were loaded successfully,
+         values shown by current profiles are carried over, None otherwise
+        """
+        now = time.perf_counter()
+        if now - self.last_poll < self.poll_interval:
+            return None
+        self.last_poll = now
+        if current is not None and not self.changed():
+            return None
+        try:
+            profiles = self.load()
+        except Exception as e:
+            print(f"failed to load profiles config {self.config_filename}: {e}")
+            self.socketio.emit('profiles/error', str(e))
+            return None
+
+        if current is not None:
+            previous = {handler.profile_id: handler for handler in current.handlers}
+            for handler in profiles.handlers:
+                if handler.profile_id in previous:
+                    handler.copy_values(previous[handler.profile_id])
+        return profiles
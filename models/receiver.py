@@ -0,0 +1,250 @@
+import json
+import threading
+
+from flask_socketio import SocketIO
+
+import numpy as np
+
+from .session import Session
+from .chart_cache import ChartCache
+from .scheduler import EmitScheduler
+from .outbox import Outbox
+from .snapshot import Snapshot, raw_delta, changed_keys
+from utils import get_emit_policy, StageTimer, downsample
+
+
+class Receiver:
+    """
+    Serves client sessions from snapshots of the receiver state published by a subclass: charts of every session,
+    raw values, locations and origins are emitted by streams of one emit scheduler.
+    """
+
+    def __init__(self, config='app_config.json'):
+        self.running = True
+        self.timer = StageTimer()
+        self.scheduler = EmitScheduler(self.timer)
+
+        with open(config, encoding='utf-8') as f:
+            self.config = json.loads(f.read())
+        emit_config = self.config.get('emit', {})
+        # seconds between emits of every stream, charts interval can be set per session
+        self.emit_intervals = {
+            'profiles': self.config.get('profiles', {}).get('emitInterval', 0.1),
+            'charts': emit_config.get('charts', 0.5),
+            'raw': emit_config.get('raw', 0.5),
+            'locations': emit_config.get('locations', 0.5),
+            'origins': emit_config.get('origins', 0.5),
+        }
+        clients_config = self.config.get('clients', {})
+        # events queued per client, 0 emits directly from the sender
+        self.outbox_size = clients_config.get('outboxSize', 100)
+        # packets queued by the client transport before its outbox waits and drops stale chart frames
+        self.outbox_backlog = clients_config.get('backlog', 2)
+
+        self.recorder = None
+        self.socketio = None
+        self.emit_policies = {}
+        for origin, origin_config in self.config.get('origins', {}).items():
+            policy = get_emit_policy(origin_config.get('emit', {}))
+            if policy is not None:
+                self.emit_policies[origin] = policy
+
+        self.snapshot = Snapshot()
+        # parts of snapshots last emitted by the sender, compared by identity to find changes
+        self.emitted = Snapshot(0, self.snapshot.data, self.snapshot.raw_values, self.snapshot.locations,
+                                self.snapshot.trail_points, self.snapshot.location_history)
+        # location histories are appended in place, held while appending to them or reading them
+        self.history_lock = threading.Lock()
+
+        # replaced, not mutated, so readers can iterate it without locks, writers take sessions_lock
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.chart_cache = ChartCache()
+        self.key_display_names = {}
+
+    def start_client_streams(self, socketio: SocketIO):
+        """
+        Adds streams emitting charts of sessions, raw values, locations and origins.
+        """
+        for session in self.sessions.values():
+            self.start_session(session)
+        self.scheduler.add('cache', self.emit_intervals['charts'], self.chart_cache.evict)
+        self.scheduler.add('raw', self.emit_intervals['raw'], lambda: self.emit_raw_values(socketio))
+        self.scheduler.add('locations', self.emit_intervals['locations'], lambda: self.emit_locations(socketio))
+        self.scheduler.add('origins', self.emit_intervals['origins'], lambda: self.emit_origins(socketio))
+
+    def emit_locations(self, socketio: SocketIO):
+        snapshot = self.snapshot
+        for session in self.sessions.values():
+            session.send_locations(snapshot.locations, session.outbox or socketio)
+        changed = changed_keys(self.emitted.trail_points, snapshot.trail_points)
+        self.emitted.trail_points = snapshot.trail_points
+        if changed:
+            for session in self.sessions.values():
+                session.send_trail_locations(snapshot.trail_points, changed, session.outbox or socketio)
+
+    def emit_origins(self, socketio: SocketIO):
+        snapshot = self.snapshot
+        if snapshot.data is not self.emitted.data:
+            self.emitted.data = snapshot.data
+            socketio.emit('charts/origins', self.get_origins())
+        if snapshot.location_history is not self.emitted.location_history:
+            self.emitted.location_history = snapshot.location_history
+            socketio.emit('maps/origins', self.get_location_origins())
+
+    def start_session(self, session: Session):
+        """
+        Emits charts of session every interval of the session, or the charts emit interval if it has none,
+        through an outbox of the client when outboxes are enabled.
+        """
+        if self.outbox_size > 0:
+            session.outbox = Outbox(self.socketio, session.session_id, self.outbox_size, self.outbox_backlog,
+                                    session.request_resync)
+            session.outbox.start()
+        self.scheduler.add(f'charts/{session.session_id}', session.interval or self.emit_intervals['charts'],
+                           lambda: session.execute(self.snapshot.data, session.outbox or self.socketio,
+                                                   self.chart_cache),
+                           'charts')
+
+    @property
+    def data(self):
+        return self.snapshot.data
+
+    @property
+    def raw_values(self):
+        return self.snapshot.raw_values
+
+    @property
+    def locations(self):
+        return self.snapshot.locations
+
+    @property
+    def location_history(self):
+        return self.snapshot.location_history
+
+    def send_last_messages(self):
+        if self.socketio:
+            self.socketio.emit('raw/data', self.data)
+
+    def get_origin_display_name(self, origin: str):
+        origin_config = self.config.get('origins', {}).get(origin, {})
+        return origin_config.get('displayName', origin)
+
+    def get_origin_keys_display_names(self, origin: str, keys: list[str]):
+        return [self.get_key_display_name(origin, key) for key in keys]
+
+    def get_key_display_name(self, origin: str, key: str):
+        key_name = self.key_display_names.get((origin, key))
+        if key_name is None:
+            origin_config = self.config.get('origins', {}).get(origin, {})
+            display_names = origin_config.get('keys', {})
+            key_name = {"name": key, "displayName": display_names.get(key, key)}
+            self.key_display_names[(origin, key)] = key_name
+        return key_name
+
+    def get_origins(self):
+        ret_list = []
+        for (origin, v) in self.snapshot.data.items():
+            display_name = self.get_origin_display_name(origin)
+            keys = self.get_origin_keys_display_names(origin, v.keys())
+            ret_list.append(
+                {"name": origin, "displayName": display_name, "keys": keys})
+        return ret_list
+
+    def get_locations(self):
+        ret_data = {}
+        for origin, value in self.snapshot.locations.items():
+            ret_data[origin] = {**value, "displayName": self.get_origin_display_name(origin)}
+        return ret_data
+
+    def create_session(self, session_name: str):
+        session = Session(session_name, self.emit_policies)
+        with self.sessions_lock:
+            self.sessions = {**self.sessions, session_name: session}
+        if self.socketio is not None:
+            self.start_session(session)
+        return session_name
+
+    def configure_session(self, session_name: str, data: dict):
+        session = self.get_session(session_name)
+        if session is None:
+            return
+        session.configure(data)
+        self.scheduler.set_interval(f'charts/{session_name}', session.interval or self.emit_intervals['charts'])
+
+    def get_client_stats(self):
+        """
+        :return: session -> outbox counters of sessions with outboxes
+        """
+        return {name: session.outbox.stats() for name, session in self.sessions.items()
+                if session.outbox is not None}
+
+    def get_session(self, session_name: str):
+        return self.sessions.get(session_name)
+
+    def remove_session(self, session_name: str):
+        with self.sessions_lock:
+            sessions = dict(self.sessions)
+            session = sessions.pop(session_name, None)
+            if session is None:
+                return False
+            self.sessions = sessions
+        self.scheduler.remove(f'charts/{session_name}')
+        if session.outbox is not None:
+            session.outbox.stop()
+        return True
+
+    def configure_locations(self, session: Session, fields):
+        """
+        Sets locations of session.
+
+        :return: last locations of their histories, read under history_lock
+        """
+        with self.history_lock:
+            return session.configure_locations(fields, self.snapshot.location_history)
+
+    def get_location_origins(self):
+        origins_list = []
+        for origin in self.snapshot.location_history.keys():
+            origins_list.append({'name': origin, 'displayName': self.get_origin_display_name(origin)})
+        return origins_list
+
+    def get_raw_values(self):
+        ret_data = {}
+        for origin, value in self.snapshot.raw_values.items():
+            ret_data[origin] = {**value, 'keys': list(value.get('keys').values())}
+        return ret_data
+
+    def emit_raw_values(self, socketio):
+        raw_values = self.snapshot.raw_values
+        emit_value = raw_delta(self.emitted.raw_values, raw_values)
+        self.emitted.raw_values = raw_values
+        if emit_value:
+            socketio.emit('raw/delta', emit_value)
+
+    def get_range(self, origin: str, key: str, start: float, end: float):
+        """
+        :return: timestamps and values of samples with start < timestamp <= end, samples older than the ones
+         kept in memory are read from the recording
+        """
+        series = self.snapshot.data.get(origin, {}).get(key)
+        if series is None or not len(series):
+            if self.recorder is None:
+                return np.array([]), np.array([])
+            return self.recorder.read(origin, key, start, end)
+        first_in_memory = series[0].timestamp
+        if self.recorder is None or start >= first_in_memory:
+            return series.window(start, end)
+        # samples up to the oldest one in memory come from the recording, the rest from memory
+        recorded_timestamps, recorded_values = self.recorder.read(origin, key, start, min(end, first_in_memory))
+        timestamps, values = series.window(max(start, first_in_memory), end)
+        return np.concatenate((recorded_timestamps, timestamps)), np.concatenate((recorded_values, values))
+
+    def get_range_columns(self, origin: str, keys: list[str], start: float, end: float, points: int):
+        """
+        :return: generator of (key, (timestamps, values)) of samples of keys with start < timestamp <= end reduced
+         to points, every key is read once the response streaming it gets to it
+        """
+        for key in keys:
+            # memory windows are copies, the receiver keeps writing to the series while the response is streamed
+            yield key, downsample(*self.get_range(origin, key, start, end), points)
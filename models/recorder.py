@@ -0,0 +1,205 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+SAMPLE = np.dtype([('timestamp', '<f8'), ('value', '<f8')])
+# receive time, topic length, payload length
+PAYLOAD_HEADER = struct.Struct('<dHI')
+
+
+class Segment:
+    """
+    Directory with one file of (timestamp, value) float64 records per series and index.json describing them,
+    optionally with a log of raw payloads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = os.path.join(path, 'index.json')
+        self.series = {}
+        self.start = None
+        self.end = None
+        self.size = 0
+        self.created = time.time()
+        if os.path.isfile(self.index_path):
+            with open(self.index_path) as f:
+                index = json.loads(f.read())
+            self.series = {(origin, key): filename for origin, key, filename in index.get('series', [])}
+            self.start = index.get('start')
+            self.end = index.get('end')
+            self.created = index.get('created', self.created)
+
+    def write_index(self):
+        index = {
+            'created': self.created,
+            'start': self.start,
+            'end': self.end,
+            'series': [[origin, key, filename] for (origin, key), filename in self.series.items()],
+        }
+        with open(self.index_path + '.tmp', 'w') as f:
+            f.write(json.dumps(index))
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    def series_file(self, origin: str, key: str, create=False):
+        filename = self.series.get((origin, key))
+        if filename is None:
+            if not create:
+                return None
+            filename = f"series_{len(self.series)}.bin"
+            self.series[(origin, key)] = filename
+        return os.path.join(self.path, filename)
+
+    def append(self, origin: str, key: str, samples: np.ndarray):
+        with open(self.series_file(origin, key, create=True), 'ab') as f:
+            f.write(samples.tobytes())
+        self.size += samples.nbytes
+        first, last = float(samples['timestamp'][0]), float(samples['timestamp'][-1])
+        self.start = first if self.start is None else min(self.start, first)
+        self.end = last if self.end is None else max(self.end, last)
+
+    def append_payloads(self, payloads):
+        with open(os.path.join(self.path, 'payloads.bin'), 'ab') as f:
+            for received, topic, payload in payloads:
+                topic = topic.encode()
+                f.write(PAYLOAD_HEADER.pack(received, len(topic), len(payload)))
+                f.write(topic)
+                f.write(payload)
+                self.size += PAYLOAD_HEADER.size + len(topic) + len(payload)
+
+    def read(self, origin: str, key: str, start: float, end: float):
+        """
+        :return: memory mapped records of series with start < timestamp <= end
+        """
+        path = self.series_file(origin, key)
+        if path is None or not os.path.isfile(path) or os.path.getsize(path) < SAMPLE.itemsize:
+            return None
+        samples = np.memmap(path, dtype=SAMPLE, mode='r', shape=(os.path.getsize(path) // SAMPLE.itemsize,))
+        timestamps = samples['timestamp']
+        first = np.searchsorted(timestamps, start, 'right')
+        last = np.searchsorted(timestamps, end, 'right')
+        return samples[first:last]
+
+    def read_payloads(self):
+        """
+        :return: generator of (receive time, topic, payload) of recorded payloads
+        """
+        path = os.path.join(self.path, 'payloads.bin')
+        if not os.path.isfile(path):
+            return
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(PAYLOAD_HEADER.size)
+                if len(header) < PAYLOAD_HEADER.size:
+                    return
+                received, topic_length, payload_length = PAYLOAD_HEADER.unpack(header)
+                topic = f.read(topic_length).decode()
+                payload = f.read(payload_length)
+                if len(payload) < payload_length:
+                    return
+                yield received, topic, payload
+
+
+class Recorder:
+    """
+    Append only recording of decoded samples (and optionally raw payloads) in segments rotated by size or time.
+    record only queues samples, a writer thread appends them to segment files every flush_interval.
+    """
+
+    def __init__(self, directory='recordings', segment_size=64 * 1024 * 1024, segment_duration=3600,
+                 flush_interval=1.0, payloads=False):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segment_duration = segment_duration
+        self.flush_interval = flush_interval
+        self.payloads = payloads
+        self.running = False
+        self.pending = deque()
+        self.pending_payloads = deque()
+        self.lock = threading.Lock()
+        self.written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments = [Segment(os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+                         if os.path.isdir(os.path.join(directory, name))]
+        self.segment = None
+
+    def record(self, origin: str, key: str, timestamp: float, value: float):
+        self.pending.append((origin, key, timestamp, value))
+
+    def record_payload(self, topic: str, payload: bytes):
+        if self.payloads:
+            self.pending_payloads.append((time.time(), topic, payload))
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, name="recorder", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.flush()
+
+    def run(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"failed to write recording: {e}")
+
+    def new_segment(self):
+        if self.segment is not None:
+            self.segment.write_index()
+        path = os.path.join(self.directory, f"{int(time.time() * 1000):015d}")
+        while os.path.exists(path):
+            path += '_'
+        os.makedirs(path)
+        self.segment = Segment(path)
+        self.segments.append(self.segment)
+
+    def flush(self):
+        with self.lock:
+            samples = {}
+            for _ in range(len(self.pending)):
+                origin, key, timestamp, value = self.pending.popleft()
+                samples.setdefault((origin, key), []).append((timestamp, value))
+            payloads = [self.pending_payloads.popleft() for _ in range(len(self.pending_payloads))]
+            if not samples and not payloads:
+                return
+
+            if (self.segment is None or self.segment.size >= self.segment_size or
+                    time.time() - self.segment.created >= self.segment_duration):
+                self.new_segment()
+            for (origin, key), series_samples in samples.items():
+                self.segment.append(origin, key, np.array(series_samples, dtype=SAMPLE))
+                self.written += len(series_samples)
+            if payloads:
+                self.segment.append_payloads(payloads)
+            self.segment.write_index()
+
+    def read(self, origin: str, key: str, start: float, end: float):
+        """
+        :return: timestamps and values of recorded samples of series with start < timestamp <= end
+        """
+        timestamps, values = [], []
+        for segment in list(self.segments):
+            if segment.start is None or segment.end <= start or segment.start > end:
+                continue
+            samples = segment.read(origin, key, start, end)
+            if samples is not None and len(samples):
+                timestamps.append(np.array(samples['timestamp']))
+                values.append(np.array(samples['value']))
+        if not timestamps:
+            return np.array([]), np.array([])
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def read_payloads(self):
+        """
+        :return: generator of (receive time, topic, payload) of all recorded payloads in recording order
+        """
+        for segment in list(self.segments):
+            yield from segment.read_payloads()
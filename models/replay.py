@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from time import perf_counter
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from .recorder import Recorder
+
+
+class Replay:
+    """
+    Feeds a recording through the receiver, recorded payloads go through the ingest queue like mqtt messages.
+    Recordings without payloads are replayed from recorded samples grouped into messages by origin and timestamp.
+
+    :param speed: replay speed relative to the recording, 0 replays as fast as possible
+    """
+
+    def __init__(self, receiver, directory: str, speed: float = 1.0):
+        if not os.path.isdir(directory):
+            raise ValueError(f"recording directory {directory} not found")
+        self.receiver = receiver
+        self.recorder = Recorder(directory)
+        self.speed = speed
+        self.messages = 0
+        self.elapsed = 0
+        self.finished = threading.Event()
+        self.first_time = None
+        self.start_time = None
+
+    def start(self):
+        threading.Thread(target=self.run, name="replay", daemon=True).start()
+
+    def run(self):
+        self.receiver.timer.reset()
+        self.start_time = perf_counter()
+        print(f"replaying {self.recorder.directory} at {'max' if self.speed <= 0 else f'{self.speed}x'} speed")
+        self.messages = self.replay_payloads()
+        if not self.messages:
+            self.messages = self.replay_samples()
+        self.receiver.ingest.join()
+        self.elapsed = perf_counter() - self.start_time
+        print(self.report())
+        self.finished.set()
+
+    def wait_for(self, recorded_time: float):
+        if self.speed <= 0:
+            return
+        if self.first_time is None:
+            self.first_time = recorded_time
+        delay = self.start_time + (recorded_time - self.first_time) / self.speed - perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def replay_payloads(self) -> int:
+        count = 0
+        for received, topic, payload in self.recorder.read_payloads():
+            self.wait_for(received)
+            msg = mqtt.MQTTMessage(topic=topic.encode())
+            msg.payload = payload
+            self.receiver.ingest.put(msg, block=True)
+            count += 1
+        return count
+
+    def replay_samples(self) -> int:
+        count = 0
+        for segment in list(self.recorder.segments):
+            names, timestamps, values, ids, origins = [], [], [], [], []
+            origin_ids = {}
+            for origin, key in list(segment.series.keys()):
+                samples = segment.read(origin, key, -np.inf, np.inf)
+                if samples is None:
+                    continue
+                timestamps.append(samples['timestamp'])
+                values.append(samples['value'])
+                ids.append(np.full(len(samples), len(names)))
+                origins.append(np.full(len(samples), origin_ids.setdefault(origin, len(origin_ids))))
+                names.append((origin, key))
+            if not names:
+                continue
+            timestamps = np.concatenate(timestamps)
+            values = np.concatenate(values).tolist()
+            ids = np.concatenate(ids)
+            # samples of one origin with the same timestamp are one message
+            order = np.lexsort((np.concatenate(origins), timestamps))
+
+            message = None
+            for i in order.tolist():
+                origin, key = names[ids[i]]
+                timestamp = float(timestamps[i])
+                if message is None or message[0] != origin or message[1] != timestamp:
+                    if message is not None:
+                        count += self.apply(*message)
+                    message = (origin, timestamp, {})
+                message[2][key] = values[i]
+            if message is not None:
+                count += self.apply(*message)
+        return count
+
+    def apply(self, origin: str, timestamp: float, parsed: dict) -> int:
+        self.wait_for(timestamp)
+        with self.receiver.timer.measure('apply'):
+            self.receiver.apply_message(origin, timestamp, parsed)
+            self.receiver.publish()
+        return 1
+
+    def report(self) -> str:
+        rate = self.messages / self.elapsed if self.elapsed else 0
+        ingest = self.receiver.ingest.stats()
+        return '\n'.join([
+            f"replayed {self.messages} messages in {self.elapsed:.3f} s, {rate:.0f} messages/s",
+            f"ingest: dropped {ingest['dropped']}, max queue depth {ingest['maxQueueDepth']}, "
+            f"max batch size {ingest['maxBatchSize']}",
+            self.receiver.timer.report(),
+        ])
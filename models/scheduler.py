@@ -0,0 +1,128 @@
+import math
+import threading
+import time
+
+from utils import StageTimer
+
+
+class Stream:
+    def __init__(self, name: str, interval: float, callback, stage: str = None):
+        if interval <= 0:
+            raise ValueError(f"Interval of stream {name} has to be positive")
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.stage = stage if stage is not None else name
+        self.deadline = 0.0
+
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.max_lateness = 0.0
+
+
+class EmitScheduler:
+    """
+    Runs callbacks of named streams every interval seconds on one thread.
+    Next deadline is the previous deadline plus interval, so time spent in callbacks does not stretch the period.
+    A tick finishing after the next deadline is an overrun, deadlines it missed are skipped instead of
+    being run back to back.
+    """
+
+    def __init__(self, timer: StageTimer = None, clock=time.monotonic):
+        self.timer = timer
+        self.clock = clock
+        self.streams = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+
+    def add(self, name: str, interval: float, callback, stage: str = None):
+        """
+        First deadline is the next multiple of interval, so streams with the same interval tick together
+        and sessions can share chart cache entries.
+        """
+        stream = Stream(name, interval, callback, stage)
+        stream.deadline = math.ceil(self.clock() / interval) * interval
+        with self.lock:
+            self.streams[name] = stream
+        self.wakeup.set()
+
+    def remove(self, name: str):
+        with self.lock:
+            self.streams.pop(name, None)
+
+    def set_interval(self, name: str, interval: float):
+        if interval <= 0:
+            raise ValueError(f"Interval of stream {name} has to be positive")
+        with self.lock:
+            stream = self.streams.get(name)
+            if stream is None:
+                return
+            # next tick comes at most interval from now
+            stream.deadline = min(stream.deadline, self.clock() + interval)
+            stream.interval = interval
+        self.wakeup.set()
+
+    def run_pending(self) -> float:
+        """
+        Runs callbacks of streams with deadlines that passed, in deadline order.
+
+        :return: seconds until the next deadline
+        """
+        now = self.clock()
+        with self.lock:
+            due = sorted((stream for stream in self.streams.values() if stream.deadline <= now),
+                         key=lambda stream: stream.deadline)
+        for stream in due:
+            start = self.clock()
+            lateness = start - stream.deadline
+            if lateness > stream.max_lateness:
+                stream.max_lateness = lateness
+            try:
+                stream.callback()
+            except Exception as e:
+                print(f"Emit stream {stream.name} failed: {e}")
+            end = self.clock()
+            if self.timer is not None:
+                self.timer.add(stream.stage, end - start)
+
+            stream.ticks += 1
+            stream.deadline += stream.interval
+            if stream.deadline <= end:
+                missed = math.floor((end - stream.deadline) / stream.interval) + 1
+                stream.overruns += 1
+                stream.skipped += missed
+                stream.deadline += missed * stream.interval
+        with self.lock:
+            if not self.streams:
+                return math.inf
+            return max(min(stream.deadline for stream in self.streams.values()) - self.clock(), 0)
+
+    def run(self, keep_running=None):
+        """
+        :param keep_running: callable checked every tick, scheduler stops once it returns False
+        """
+        self.running = True
+        while self.running and (keep_running is None or keep_running()):
+            self.wakeup.clear()
+            wait = self.run_pending()
+            self.wakeup.wait(min(wait, 1.0))
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def stats(self):
+        """
+        :return: stream -> interval, ticks, overruns, skipped deadlines and max lateness in seconds
+        """
+        with self.lock:
+            streams = list(self.streams.values())
+        return {stream.name: {
+            'interval': stream.interval,
+            'ticks': stream.ticks,
+            'overruns': stream.overruns,
+            'skipped': stream.skipped,
+            'maxLateness': stream.max_lateness,
+        } for stream in streams}
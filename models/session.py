@@ -1,21 +1,95 @@
+from bisect import bisect_left
+from collections import deque
 from typing import Dict, List, Union
 
+import numpy as np
 from flask_socketio import SocketIO
 
-from utils import get_data_points, largest_triangle_three_buckets, DataType, filter_points
+from utils import lttb_indices, DataType, outlier_mask, window_size, TimeSeries, tail, EmitPolicy
+from .chart_cache import ChartCache
+
+
+# windows with up to this many samples are always drawn from the samples
+rollup_min_samples = 10000
+
+
+def get_window(series: TimeSeries, timestamp: float, policy: EmitPolicy = None):
+    """
+    :return: timestamps and values of samples after timestamp without outliers, passed through emit policy
+    """
+    # filter only the visible window, with window_size context points so its first points are filtered
+    # the same way as they would be in the whole history
+    # samples appended while the series is read are left out
+    index, timestamps, values = series.since(timestamp, window_size)
+    window_start = min(int(np.searchsorted(timestamps, timestamp, 'right')), len(timestamps) - 1)
+    keep = outlier_mask(values)
+    keep[:window_start] = False
+    if policy is None:
+        return timestamps[keep], values[keep]
+    indices = np.arange(index, index + len(timestamps))
+    return policy.apply(timestamps[keep], values[keep], indices[keep])
+
+
+def get_series_points(series: TimeSeries, timeframe: float, points: int, policy: EmitPolicy = None):
+    """
+    :return: [timestamp, value] pairs of the last timeframe seconds of series without outliers, passed through
+     emit policy and reduced to points
+    Long windows of origins without emit policy are served from the coarsest rollup with enough buckets,
+    its closed buckets as min and max points at bucket starts, and the still open last bucket from samples.
+    Rollups aggregate only samples kept by the outlier filter, so both parts are filtered the same way.
+    """
+    timestamp = series.last_timestamp - timeframe
+    rollup = series.get_rollup(timestamp, points, rollup_min_samples) if policy is None else None
+    if rollup is None:
+        timestamps, values = get_window(series, timestamp, policy)
+    else:
+        stats = rollup.window_stats(timestamp)
+        closed = len(stats['timestamps']) - 1
+        open_timestamps, open_values = get_window(series, np.nextafter(rollup.last_timestamp, -np.inf))
+        timestamps = np.concatenate((np.repeat(stats['timestamps'][:closed], 2), open_timestamps))
+        envelope = np.column_stack((stats['min'][:closed], stats['max'][:closed])).ravel()
+        values = np.concatenate((envelope, open_values))
+    indices = lttb_indices(timestamps, values, points)
+    return np.column_stack((timestamps[indices], values[indices])).tolist()
 
 
 class Session:
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, emit_policies: Dict[str, EmitPolicy] = None):
         self.session_id = session_id
+        self.emit_policies = emit_policies if emit_policies is not None else {}
         self.fields = []
         self.timeframe = 0.1
         self.points = 10
         self.locations = []
-
-    def execute(self, data: DataType, socketio: SocketIO):
-        points = self.get_points(data)
-        socketio.emit('charts/data', points, to=self.session_id)
+        # seconds between chart emits, None for the receiver default
+        self.interval = None
+
+        # incremental mode, sends charts/delta and a full charts/data resync after every resync incremental ticks
+        self.incremental = False
+        self.resync = 20
+        self.ticks_since_resync = 0
+        # (origin, key) -> (last sample index, timestamp of the last point) of the last sent series
+        self.sent = {}
+        # outbound queue of the client, None to emit directly
+        self.outbox = None
+
+    def execute(self, data: DataType, socketio: SocketIO, cache: ChartCache = None):
+        if not self.incremental or self.ticks_since_resync >= self.resync:
+            self.ticks_since_resync = 0
+            points = self.get_points(data, cache)
+            socketio.emit('charts/data', points, to=self.session_id)
+            return
+        self.ticks_since_resync += 1
+        delta = self.get_delta(data, cache)
+        if delta:
+            socketio.emit('charts/delta', delta, to=self.session_id)
+
+    def request_resync(self):
+        """
+        Sends full charts/data on the next tick, after a delta did not reach the client.
+        """
+        self.ticks_since_resync = self.resync
+        self.sent = {}
 
     def configure(self, data: Dict[str, Union[Dict[str, List[str]], Union[str, float], Union[str, int]]]):
         # setting origins
@@ -41,9 +115,26 @@ class Session:
             self.points = int(data.get("points", self.points))
         except Exception as e:
             print(f"Failed to set points for data {data}: {e}")
+        # setting emit interval
+        try:
+            interval = data.get("interval", self.interval)
+            if interval is not None and float(interval) <= 0:
+                raise ValueError("interval has to be positive")
+            self.interval = None if interval is None else float(interval)
+        except Exception as e:
+            print(f"Failed to set interval for data {data}: {e}")
+        # setting incremental mode
+        try:
+            self.incremental = bool(data.get("incremental", self.incremental))
+            self.resync = int(data.get("resync", self.resync))
+        except Exception as e:
+            print(f"Failed to set incremental mode for data {data}: {e}")
+        # configuration changed, start with a full resync
+        self.ticks_since_resync = self.resync
+        self.sent = {}
         return None
 
-    def get_points(self, data: DataType):
+    def get_points(self, data: DataType, cache: ChartCache = None):
         ret_data = {}
         for field in self.fields:
             origin = field.get('origin')
@@ -58,14 +149,53 @@ class Session:
                     ret_data[origin][key] = []
                     continue
 
-                timestamp = points[-1].timestamp - self.timeframe
-                points = filter_points(points)
-                points = get_data_points(points, timestamp)
-                points = largest_triangle_three_buckets(points, self.points)
-                points = [[point.timestamp, point.value] for point in points]
-                ret_data[origin][key] = points
+                ret_data[origin][key] = self.get_series_points(origin, key, points, cache)
         return ret_data
 
+    def get_delta(self, data: DataType, cache: ChartCache = None):
+        """
+        Points changed since the last sent series, keys without new samples are skipped.
+        For every key client should drop its points older than start and points from timestamp on,
+        then append points.
+
+        :return: {origin: {key: {'start': float, 'from': float, 'points': [[timestamp, value]]}}}
+        """
+        ret_data = {}
+        for field in self.fields:
+            origin = field.get('origin')
+            origin_data = data.get(origin)
+            if not origin_data:
+                continue
+            for key in field.get('keys'):
+                series = origin_data.get(key)
+                if not series:
+                    continue
+                sent_total, sent_timestamp = self.sent.get((origin, key), (None, None))
+                if sent_total == series.total:
+                    continue
+
+                points = self.get_series_points(origin, key, series, cache)
+                if not points:
+                    continue
+                # the last sent point may not be picked by downsampling anymore, so it is resent as well
+                start = 0 if sent_timestamp is None else bisect_left(points, [sent_timestamp])
+                ret_data.setdefault(origin, {})[key] = {
+                    'start': points[0][0],
+                    'from': points[start][0] if start < len(points) else points[-1][0],
+                    'points': points[start:],
+                }
+        return ret_data
+
+    def get_series_points(self, origin: str, key: str, series: TimeSeries, cache: ChartCache = None):
+        policy = self.emit_policies.get(origin)
+        if cache is None:
+            points = get_series_points(series, self.timeframe, self.points, policy)
+        else:
+            cache_key = (origin, key, self.timeframe, self.points, series.total)
+            points = cache.get(cache_key, get_series_points, series, self.timeframe, self.points, policy)
+        self.sent[(origin, key)] = (series.total, points[-1][0] if points else None)
+        return points
+
     def configure_locations(self, fields, locations_history):
         if not isinstance(fields, list):
             raise Exception("Wrong format")
@@ -77,8 +207,8 @@ class Session:
         ret_dict = {}
         for key in self.locations:
             history = locations_history.get(key)
-            if history is not None and isinstance(history, list):
-                ret_dict[key] = history[-200:]
+            if history is not None and isinstance(history, (list, deque)):
+                ret_dict[key] = tail(history, 200)
 
         return ret_dict
 
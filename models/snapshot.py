@@ -0,0 +1,80 @@
+class Snapshot:
+    """
+    Receiver state published once per ingest batch and never mutated afterwards.
+    A snapshot copies only the dicts that changed in its batch and shares the rest with the previous one,
+    so readers can keep and iterate a snapshot without locks and find what changed since an older snapshot
+    by comparing identities. Series and location histories are shared buffers appended in place, read series
+    through their own size and location histories under history_lock of the receiver.
+    """
+
+    __slots__ = ('version', 'data', 'raw_values', 'locations', 'trail_points', 'location_history')
+
+    def __init__(self, version=0, data=None, raw_values=None, locations=None, trail_points=None,
+                 location_history=None):
+        self.version = version
+        # origin -> key -> TimeSeries
+        self.data = data if data is not None else {}
+        # origin -> {'name', 'displayName', 'timestamp', 'keys': {key: {'name', 'displayName', 'value'}}}
+        self.raw_values = raw_values if raw_values is not None else {}
+        # origin -> {'lat', 'lng', 'alt'}
+        self.locations = locations if locations is not None else {}
+        # origin -> last location added to its trail
+        self.trail_points = trail_points if trail_points is not None else {}
+        # origin -> deque of trail locations
+        self.location_history = location_history if location_history is not None else {}
+
+
+def publish_raw_values(published: dict, working: dict, changes: dict) -> dict:
+    """
+    :param published: raw values of the previous snapshot
+    :param working: raw values mutated by ingest, in the same shape
+    :param changes: origin -> keys changed since the previous snapshot
+    :return: raw values with new dicts for changed origins and keys, unchanged keys keep their published dicts
+    """
+    raw_values = dict(published)
+    for origin, keys in changes.items():
+        value = working[origin]
+        previous = published.get(origin)
+        origin_keys = dict(previous['keys']) if previous is not None else {}
+        for key in keys:
+            origin_keys[key] = dict(value['keys'][key])
+        raw_values[origin] = {**value, 'keys': origin_keys}
+    return raw_values
+
+
+def raw_delta(previous: dict, current: dict) -> dict:
+    """
+    :return: origin -> raw value with a list of keys published after previous, origins without changes are skipped
+    """
+    delta = {}
+    for origin, value in current.items():
+        previous_value = previous.get(origin)
+        if value is previous_value:
+            continue
+        previous_keys = previous_value['keys'] if previous_value is not None else {}
+        keys = [key_value for key, key_value in value['keys'].items() if previous_keys.get(key) is not key_value]
+        if keys:
+            delta[origin] = {**value, 'keys': keys}
+    return delta
+
+
+def changed_keys(previous: dict, current: dict) -> list:
+    """
+    :return: keys of current with values published after previous
+    """
+    return [key for key, value in current.items() if previous.get(key) is not value]
+
+
+def apply_raw_delta(raw_values: dict, delta: dict) -> dict:
+    """
+    :param delta: raw delta as returned by raw_delta
+    :return: raw values with new dicts for origins and keys in delta, other keys keep their dicts
+    """
+    raw_values = dict(raw_values)
+    for origin, value in delta.items():
+        previous = raw_values.get(origin)
+        origin_keys = dict(previous['keys']) if previous is not None else {}
+        for key_value in value['keys']:
+            origin_keys[key_value['name']] = key_value
+        raw_values[origin] = {**value, 'keys': origin_keys}
+    return raw_values
@@ -0,0 +1,101 @@
+import hashlib
+import random
+import time
+
+import requests
+from flask_socketio import SocketIO
+
+
+class StatusPoller:
+    """
+    Polls the status application over one keep-alive session and emits statuses/data only when the status changed.
+    Requests are conditional on the ETag or Last-Modified of the previous response when the status app sends them,
+    otherwise unchanged responses are recognised by their hash. Failed polls are retried after an exponential
+    backoff with full jitter.
+    """
+
+    def __init__(self, url: str, interval: float = 0.2, timeout: float = 2.0, backoff: float = 0.5,
+                 max_backoff: float = 30.0):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self.status = None
+        self.failures = 0
+
+        self.polls = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.emits = 0
+        self.errors = 0
+
+    def poll(self, socketio: SocketIO) -> bool:
+        """
+        :return: whether the status changed and was emitted
+        """
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        self.polls += 1
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            self.not_modified += 1
+            return False
+        if response.status_code != 200:
+            raise ValueError(f'Received invalid status code {response.status_code}')
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        if digest == self.digest:
+            self.unchanged += 1
+            return False
+        status = response.json()
+        self.digest = digest
+        self.status = status
+        self.emits += 1
+        socketio.emit('statuses/data', status)
+        return True
+
+    def retry_delay(self) -> float:
+        """
+        :return: random delay up to backoff doubled with every consecutive failure, capped at max_backoff
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** min(self.failures - 1, 32)))
+
+    def run(self, socketio: SocketIO, keep_running=lambda: True):
+        while keep_running():
+            start = time.monotonic()
+            try:
+                self.poll(socketio)
+                self.failures = 0
+                delay = self.interval - (time.monotonic() - start)
+            except Exception as e:
+                self.errors += 1
+                self.failures += 1
+                delay = self.retry_delay()
+                print(f"Failed to fetch status from {self.url}, retrying in {delay:.1f} s: {e}")
+            if delay > 0:
+                time.sleep(delay)
+
+    def emit_status(self, socketio: SocketIO, to: str = None):
+        if self.status is not None:
+            socketio.emit('statuses/data', self.status, to=to)
+
+    def stats(self):
+        return {
+            'polls': self.polls,
+            'notModified': self.not_modified,
+            'unchanged': self.unchanged,
+            'emits': self.emits,
+            'errors': self.errors,
+            'failures': self.failures,
+        }
@@ -0,0 +1,349 @@
+import os
+import pickle
+import queue
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .mqtt_receiver import MqttReceiver
+from .replay import Replay
+from .snapshot import Snapshot, raw_delta, changed_keys
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+def encode_message(message) -> bytes:
+    payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def recv_exactly(connection: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        try:
+            count = connection.recv_into(view[received:])
+        except socket.timeout:
+            # timeouts are set for sending, a reader keeps waiting without losing what it received
+            continue
+        if not count:
+            raise EOFError("Connection closed")
+        received += count
+    return buffer
+
+
+def recv_message(connection: socket.socket):
+    size, = FRAME_HEADER.unpack(recv_exactly(connection, FRAME_HEADER.size))
+    return pickle.loads(recv_exactly(connection, size))
+
+
+def get_catalog(data) -> dict:
+    """
+    :return: origin -> key -> SharedTimeSeries.layout of the series, None for series without samples
+    """
+    return {origin: {key: series.layout() if series.name is not None else None for key, series in keys.items()}
+            for origin, keys in data.items()}
+
+
+class WorkerConnection:
+    """
+    Connection of the hub to one worker. Frames are queued without blocking and sent by a thread of the connection,
+    a worker which does not read them in time is disconnected, it exits and is restarted.
+    """
+
+    def __init__(self, connection: socket.socket, queue_size: int = 100, send_timeout: float = 5.0):
+        self.connection = connection
+        connection.settimeout(send_timeout)
+        self.queue = queue.Queue(queue_size)
+        self.closed = False
+        self.messages = 0
+        self.sent_bytes = 0
+
+    def start(self):
+        threading.Thread(target=self.send_frames, name="hub-sender", daemon=True).start()
+
+    def put(self, frame: bytes) -> bool:
+        """
+        :return: False if the queue is full or the connection closed, the connection is closed then
+        """
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            print("Worker is not reading its messages, disconnecting it")
+            self.close()
+            return False
+        return True
+
+    def send_frames(self):
+        while not self.closed:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            try:
+                self.connection.sendall(frame)
+            except OSError as e:
+                # a partially sent frame breaks the stream, the worker exits and is restarted
+                if not self.closed:
+                    print(f"Failed to send to a worker: {e}")
+                break
+            self.messages += 1
+            self.sent_bytes += len(frame)
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            # wakes threads sending to or receiving from the connection
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class WorkerHub:
+    """
+    Ingest side of the multi process mode. Worker processes serving the clients connect to the unix socket
+    at address, get the whole receiver state once and then a state message for every snapshot published
+    by the receiver: names of series appended to, the series catalog when it changed, changed raw values,
+    locations and trail points and locations added to histories. Samples are not sent, workers read them
+    from shared memory.
+
+    Has the emit signature of SocketIO, emits are broadcast to every worker which emits them to its clients,
+    workers without the addressed client ignore them.
+
+    Messages are queued to WorkerConnection of every worker, so a slow worker never blocks ingest.
+    """
+
+    def __init__(self, receiver: MqttReceiver, address: str, send_timeout: float = 5.0,
+                 stats_interval: float = 1.0, send_queue: int = 100):
+        self.receiver = receiver
+        self.address = address
+        self.send_timeout = send_timeout
+        self.stats_interval = stats_interval
+        self.send_queue = send_queue
+        self.listener = None
+        self.connections = []
+        # held while queueing, so state messages reach every worker in the order of snapshots
+        self.lock = threading.Lock()
+        # names of series in the last sent catalog
+        self.cataloged = set()
+        # pid -> stats last reported by the worker
+        self.worker_stats = {}
+
+        self.dropped = 0
+        receiver.publish_listeners.append(self.publish)
+
+    def start(self):
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.address)
+        self.listener.listen()
+        threading.Thread(target=self.accept, name="hub", daemon=True).start()
+        self.receiver.scheduler.add('workers', self.stats_interval, self.emit_stats)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+        with self.lock:
+            for worker in self.connections:
+                worker.close()
+            self.connections = []
+        for keys in self.receiver.snapshot.data.values():
+            for series in keys.values():
+                series.unlink()
+
+    def accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            worker = WorkerConnection(connection, self.send_queue, self.send_timeout)
+            with self.lock:
+                worker.put(encode_message(('state', self.get_state())))
+                self.connections.append(worker)
+            worker.start()
+            threading.Thread(target=self.serve, args=(worker,), name="hub-worker", daemon=True).start()
+
+    def get_state(self):
+        """
+        :return: state message with the whole published state, applied on top of it later state messages
+         only repeat what the worker already has
+        """
+        snapshot = self.receiver.snapshot
+        return {
+            'version': snapshot.version,
+            'series': get_catalog(snapshot.data),
+            'shared': [],
+            'raw': raw_delta({}, snapshot.raw_values),
+            'locations': snapshot.locations,
+            'trail': snapshot.trail_points,
+            'history': self.receiver.get_location_history(),
+        }
+
+    def serve(self, worker: WorkerConnection):
+        """
+        Handles requests of one worker until it disconnects.
+        """
+        pid = None
+        while True:
+            try:
+                request = recv_message(worker.connection)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                break
+            try:
+                if request[0] == 'profiles':
+                    self.receiver.emit_profiles(request[1])
+                elif request[0] == 'status':
+                    self.receiver.emit_status(request[1])
+                elif request[0] == 'stats':
+                    pid = request[1]['pid']
+                    self.worker_stats[pid] = request[1]
+            except Exception as e:
+                print(f"Failed to handle worker request {request[0]}: {e}")
+        self.worker_stats.pop(pid, None)
+        self.drop(worker)
+
+    def drop(self, worker: WorkerConnection):
+        with self.lock:
+            if worker in self.connections:
+                self.connections.remove(worker)
+                self.dropped += 1
+        worker.close()
+
+    def broadcast(self, message):
+        frame = encode_message(message)
+        with self.lock:
+            for worker in list(self.connections):
+                if not worker.put(frame):
+                    self.connections.remove(worker)
+                    self.dropped += 1
+
+    def emit(self, event: str, data=None, to: str = None):
+        self.broadcast(('emit', event, data, to))
+
+    def publish(self, previous: Snapshot, snapshot: Snapshot, history: dict):
+        """
+        Shares series appended to and sends what changed between the snapshots, called by the receiver
+        from the thread publishing them.
+        """
+        shared = []
+        catalog_changed = snapshot.data is not previous.data
+        for keys in snapshot.data.values():
+            for series in keys.values():
+                if series.share():
+                    shared.append(series.name)
+                    if series.name not in self.cataloged:
+                        catalog_changed = True
+        message = {'version': snapshot.version, 'shared': shared}
+        if catalog_changed:
+            message['series'] = get_catalog(snapshot.data)
+            self.cataloged = {series.name for keys in snapshot.data.values() for series in keys.values()
+                              if series.name is not None}
+        raw = raw_delta(previous.raw_values, snapshot.raw_values)
+        if raw:
+            message['raw'] = raw
+        if snapshot.locations is not previous.locations:
+            message['locations'] = snapshot.locations
+        trail = changed_keys(previous.trail_points, snapshot.trail_points)
+        if trail:
+            message['trail'] = {origin: snapshot.trail_points[origin] for origin in trail}
+        if history:
+            message['history'] = history
+        self.broadcast(('state', message))
+
+    def stats(self):
+        connections = self.connections
+        return {
+            'connections': len(connections),
+            'messages': sum(worker.messages for worker in connections),
+            'sentBytes': sum(worker.sent_bytes for worker in connections),
+            'queued': sum(worker.queue.qsize() for worker in connections),
+            'dropped': self.dropped,
+            'workers': dict(self.worker_stats),
+        }
+
+    def emit_stats(self):
+        """
+        Sends ingest, stage, status and worker stats to workers, which serve them on their stats endpoints.
+        """
+        self.broadcast(('stats', {
+            'ingest': self.receiver.get_ingest_stats(),
+            'stages': self.receiver.get_stage_stats(),
+            'status': self.receiver.get_status_stats(),
+            'workers': self.stats(),
+        }))
+
+
+def start_worker(address: str) -> subprocess.Popen:
+    """
+    :return: process serving clients from the ingest process at address, started with the arguments of this one
+    """
+    return subprocess.Popen([sys.executable, *sys.argv, '--worker-of', address])
+
+
+def run_ingest(config):
+    """
+    Runs the ingest process of the multi process mode until interrupted: receives mqtt traffic or a replay into
+    shared memory series and starts config.workers processes serving the clients, restarting those which exit.
+    """
+    print(config)
+    receiver = MqttReceiver(
+        config.receiver_config,
+        config.mqtt_host,
+        config.mqtt_port,
+        config.mqtt_topic,
+        config.status_app,
+        config.profiles_config,
+        connect=not config.replay,
+        shared=True)
+    workers_config = receiver.config.get('workers', {})
+    directory = tempfile.mkdtemp(prefix='pcc-')
+    hub = WorkerHub(receiver, os.path.join(directory, 'hub.sock'),
+                    workers_config.get('sendTimeout', 5.0),
+                    workers_config.get('statsInterval', 1.0),
+                    workers_config.get('sendQueue', 100))
+    hub.start()
+    threading.Thread(target=receiver.infinite_sender, args=(hub,), name="sender", daemon=True).start()
+    if config.replay:
+        Replay(receiver, config.replay, config.replay_speed).start()
+
+    # stopped like by ctrl+c, so shared memory and the socket are removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    workers = [start_worker(hub.address) for _ in range(config.workers)]
+    try:
+        while True:
+            time.sleep(1)
+            for index, worker in enumerate(workers):
+                if worker.poll() is not None:
+                    print(f"Worker {worker.pid} exited with code {worker.returncode}, restarting it")
+                    workers[index] = start_worker(hub.address)
+    except KeyboardInterrupt:
+        print("Wyłączanie")
+    finally:
+        receiver.running = False
+        if receiver.recorder is not None:
+            receiver.recorder.stop()
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            try:
+                worker.wait(5)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        hub.close()
+        shutil.rmtree(directory, ignore_errors=True)
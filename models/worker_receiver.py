@@ -0,0 +1,150 @@
+import os
+import signal
+import socket
+import threading
+from collections import deque
+
+from flask_socketio import SocketIO
+
+from .receiver import Receiver
+from .snapshot import Snapshot, apply_raw_delta
+from .worker_hub import encode_message, recv_message
+from utils import TimeSeries, SharedTimeSeries
+
+
+class WorkerReceiver(Receiver):
+    """
+    Serves clients of one worker process of the multi process mode from the state of the ingest process hub
+    at address. Series are read from shared memory without copying, the rest of the state is mirrored from
+    state messages of the hub into snapshots of this process, so sessions and streams work as in the ingest
+    process.
+    """
+
+    def __init__(self, config='app_config.json', address=None):
+        super().__init__(config)
+        locations_config = self.config.get('locations', {})
+        self.location_history_length = locations_config.get('historyLength', 100000)
+        self.stats_interval = self.config.get('workers', {}).get('statsInterval', 1.0)
+
+        # block name -> attached series
+        self.attached = {}
+        # origin -> number of locations ever added to its history by the ingest process
+        self.history_totals = {}
+        # stats relayed by the hub
+        self.relayed_stats = {}
+        self.messages = 0
+
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(address)
+        self.send_lock = threading.Lock()
+
+    def infinite_sender(self, socketio: SocketIO):
+        self.socketio = socketio
+        socketio.start_background_task(self.listen)
+        self.start_client_streams(socketio)
+        self.scheduler.add('report', self.stats_interval, self.report_stats)
+        self.scheduler.run(lambda: self.running)
+        print("Quitting receiver")
+
+    def listen(self):
+        while self.running:
+            try:
+                message = recv_message(self.connection)
+            except (OSError, EOFError) as e:
+                if not self.running:
+                    return
+                print(f"Lost connection to the ingest process, stopping worker: {e}")
+                self.running = False
+                os.kill(os.getpid(), signal.SIGTERM)
+                return
+            self.messages += 1
+            try:
+                if message[0] == 'state':
+                    self.apply_state(message[1])
+                elif message[0] == 'emit':
+                    self.socketio.emit(message[1], message[2], to=message[3])
+                elif message[0] == 'stats':
+                    self.relayed_stats = message[1]
+            except Exception as e:
+                print(f"Failed to handle {message[0]} message of the ingest process: {e}")
+
+    def send(self, request):
+        with self.send_lock:
+            self.connection.sendall(encode_message(request))
+
+    def attach(self, layout):
+        """
+        :return: series shared under layout, an empty series for series without samples yet
+        """
+        if layout is None:
+            return TimeSeries(1)
+        series = self.attached.get(layout[0])
+        if series is None:
+            series = SharedTimeSeries.attach(*layout)
+            self.attached[layout[0]] = series
+        return series
+
+    def apply_state(self, message: dict):
+        """
+        Refreshes series appended to and publishes a snapshot with the changes of the message.
+        """
+        previous = self.snapshot
+        data = previous.data
+        if 'series' in message:
+            data = {origin: {key: self.attach(layout) for key, layout in keys.items()}
+                    for origin, keys in message['series'].items()}
+        for name in message['shared']:
+            series = self.attached.get(name)
+            if series is not None:
+                series.refresh()
+
+        location_history = previous.location_history
+        for origin, (total, locations) in message.get('history', {}).items():
+            history = location_history.get(origin)
+            if history is None:
+                history = deque(maxlen=self.location_history_length)
+                location_history = {**location_history, origin: history}
+            # the first state message may already hold locations sent again by the next one
+            added = total - self.history_totals.get(origin, 0)
+            if added > 0:
+                with self.history_lock:
+                    history.extend(locations[-added:])
+                self.history_totals[origin] = total
+
+        trail_points = previous.trail_points
+        if 'trail' in message:
+            trail_points = {**trail_points, **message['trail']}
+        self.snapshot = Snapshot(
+            message['version'],
+            data,
+            apply_raw_delta(previous.raw_values, message['raw']) if 'raw' in message else previous.raw_values,
+            message.get('locations', previous.locations),
+            trail_points,
+            location_history)
+
+    def report_stats(self):
+        self.send(('stats', {
+            'pid': os.getpid(),
+            'sessions': len(self.sessions),
+            'messages': self.messages,
+            'version': self.snapshot.version,
+            'series': len(self.attached),
+        }))
+
+    def emit_profiles(self, session_name: str):
+        self.send(('profiles', session_name))
+
+    def emit_status(self, session_name: str):
+        self.send(('status', session_name))
+
+    def get_ingest_stats(self):
+        return self.relayed_stats.get('ingest', {})
+
+    def get_stage_stats(self):
+        return {**self.relayed_stats.get('stages', {}), **self.timer.stats()}
+
+    def get_status_stats(self):
+        return self.relayed_stats.get('status', {})
+
+    def get_worker_stats(self):
+        return self.relayed_stats.get('workers', {})
@@ -0,0 +1,74 @@
+import json
+import unittest
+
+import numpy as np
+
+from utils import ShapeFlattener, PayloadDecoder, STRUCT_HEADER, STRUCT_MAGIC, parse_dict, loads
+from utils import decoding
+
+messages = [
+    {'a': 1, 'b': {'c': 2, 'd': {'e': 3}}},
+    {'a': 4, 'b': {'c': 5, 'd': {'e': 6}}},
+    {'a': 7, 'b': {'c': 8, 'd': 9}},
+    {'a': 10, 'b': {'c': 11, 'x': {'e': 12}}},
+    {'a': {'z': 13}, 'b': {}},
+    {'a': 14},
+    {'a': 15, 'f': None},
+]
+
+
+class TestDecoding(unittest.TestCase):
+    def test_flatten(self):
+        flattener = ShapeFlattener()
+        for message in messages:
+            self.assertEqual(flattener.flatten('origin', message), parse_dict(message))
+
+    def test_plan_per_origin(self):
+        flattener = ShapeFlattener()
+        flattener.flatten('1', messages[0])
+        flattener.flatten('2', messages[5])
+        self.assertEqual(flattener.flatten('1', messages[1]), parse_dict(messages[1]))
+        self.assertEqual(len(flattener.plans), 2)
+
+    def test_loads(self):
+        self.assertEqual(loads(b'{"a": {"b": [1, 2.5]}}'), {'a': {'b': [1, 2.5]}})
+
+
+class TestPayloadDecoder(unittest.TestCase):
+    origins = {'31': {'struct': [['pressure.raw', '<u2'], ['pressure.scaled', '<f4']]}}
+    message = {'header': {'origin': 31, 'timestamp': {'high': 0, 'low': 20000, 'unsigned': True}},
+               'data': {'pressure': {'raw': 5, 'scaled': 0.5}}}
+    expected = [('31', 2.0, {'pressure.raw': 5, 'pressure.scaled': 0.5})]
+
+    def test_json(self):
+        decoder = PayloadDecoder(self.origins)
+        payload = json.dumps(self.message).encode()
+        self.assertEqual(decoder.detect_format('pcc/in', payload), 'json')
+        self.assertEqual(decoder.decode('pcc/in', payload), self.expected)
+        self.assertEqual(decoder.decode('pcc/in', b'{"data": {}}'), [])
+
+    def test_struct(self):
+        decoder = PayloadDecoder(self.origins)
+        record_type = np.dtype([('timestamp', '<i8'), ('raw', '<u2'), ('scaled', '<f4')])
+        records = np.array([(20000, 5, 0.5), (30000, 6, 0.75)], dtype=record_type)
+        payload = STRUCT_HEADER.pack(STRUCT_MAGIC, 31, 2) + records.tobytes()
+        self.assertEqual(decoder.detect_format('pcc/in', payload), 'struct')
+        self.assertEqual(decoder.decode('pcc/in', payload),
+                         self.expected + [('31', 3.0, {'pressure.raw': 6, 'pressure.scaled': 0.75})])
+        self.assertRaises(ValueError, decoder.decode, 'pcc/in', STRUCT_HEADER.pack(STRUCT_MAGIC, 32, 0))
+
+    def test_topic_format(self):
+        decoder = PayloadDecoder(self.origins, {'pcc/in/binary': 'struct'})
+        self.assertEqual(decoder.detect_format('pcc/in/binary', b'{'), 'struct')
+        self.assertRaises(ValueError, PayloadDecoder, {}, {'pcc/in/binary': 'xml'})
+
+    @unittest.skipIf(decoding.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        decoder = PayloadDecoder(self.origins)
+        payload = decoding.msgpack.packb(self.message)
+        self.assertEqual(decoder.detect_format('pcc/in', payload), 'msgpack')
+        self.assertEqual(decoder.decode('pcc/in', payload), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from utils import EmitPolicy, get_emit_policy
+
+timestamps = np.array([0.0, 0.5, 1.0, 1.2, 1.8, 3.0, 3.1])
+values = np.array([1.0, 3.0, 2.0, 6.0, 4.0, 5.0, 7.0])
+indices = np.arange(10, 17)
+
+
+class TestEmitPolicy(unittest.TestCase):
+    def test_all(self):
+        # origins sending all samples have no policy, so their charts still use rollups
+        self.assertIsNone(get_emit_policy({}))
+        self.assertIsNone(get_emit_policy({'policy': 'all'}))
+        self.assertEqual(EmitPolicy().apply(timestamps, values, indices)[1].tolist(), values.tolist())
+
+    def test_every_nth(self):
+        policy = get_emit_policy({'policy': 'every_nth', 'n': 3})
+        result_timestamps, result_values = policy.apply(timestamps, values, indices)
+        self.assertEqual(result_values.tolist(), [2.0, 5.0])
+        self.assertEqual(result_timestamps.tolist(), [1.0, 3.0])
+
+    def test_bucket(self):
+        for aggregate, expected in [('mean', [2.0, 4.0, 6.0]), ('min', [1.0, 2.0, 5.0]), ('max', [3.0, 6.0, 7.0])]:
+            policy = get_emit_policy({'policy': 'bucket', 'interval': 1, 'aggregate': aggregate})
+            result_timestamps, result_values = policy.apply(timestamps, values, indices)
+            self.assertEqual(result_values.tolist(), expected)
+            self.assertEqual(result_timestamps.tolist(), [0.0, 1.0, 3.0])
+
+    def test_latest(self):
+        policy = get_emit_policy({'policy': 'latest', 'interval': 1})
+        self.assertEqual(policy.apply(timestamps, values, indices)[1].tolist(), [3.0, 4.0, 7.0])
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_emit_policy, {'policy': 'drop'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import unittest
+
+import numpy as np
+
+from utils import TimeSeries, downsample, dump_data, decode_binary, ENCODERS, largest_triangle_three_buckets, \
+    DataPoint
+from utils import export
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.columns = {
+            'speed': (np.arange(5, dtype=np.float64), np.array([1.5, 2, -3, 4, 0.1])),
+            'empty': (np.array([]), np.array([])),
+        }
+
+    def test_downsample(self):
+        timestamps = np.arange(100, dtype=np.float64)
+        values = np.sin(timestamps)
+        self.assertIs(downsample(timestamps, values, 0)[0], timestamps)
+        self.assertIs(downsample(timestamps, values, 100)[0], timestamps)
+        points = largest_triangle_three_buckets([DataPoint(t, v) for t, v in zip(timestamps, values)], 10)
+        reduced = downsample(timestamps, values, 10)
+        self.assertEqual(reduced[0].tolist(), [p.timestamp for p in points])
+        self.assertEqual(reduced[1].tolist(), [p.value for p in points])
+
+    def test_json(self):
+        decoded = json.loads(''.join(ENCODERS['json'](self.columns.items())))
+        self.assertEqual(decoded['speed'], {'timestamps': [0, 1, 2, 3, 4], 'values': [1.5, 2, -3, 4, 0.1]})
+        self.assertEqual(decoded['empty'], {'timestamps': [], 'values': []})
+
+    def test_json_chunks(self):
+        export.CHUNK_SIZE = 2
+        try:
+            chunks = list(ENCODERS['json'](self.columns.items()))
+        finally:
+            export.CHUNK_SIZE = 10000
+        self.assertEqual(json.loads(''.join(chunks)), json.loads(''.join(ENCODERS['json'](self.columns.items()))))
+        # arrays are encoded CHUNK_SIZE items at a time
+        self.assertEqual(chunks[2:5], ['0.0, 1.0', ', 2.0, 3.0', ', 4.0'])
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(''.join(ENCODERS['csv'](self.columns.items())))))
+        self.assertEqual(rows[0], ['key', 'timestamp', 'value'])
+        self.assertEqual([(key, float(t), float(v)) for key, t, v in rows[1:]],
+                         [('speed', t, v) for t, v in zip(*[c.tolist() for c in self.columns['speed']])])
+
+    def test_binary(self):
+        decoded = decode_binary(b''.join(ENCODERS['binary'](self.columns.items())))
+        self.assertEqual(list(decoded), ['speed', 'empty'])
+        for key, (timestamps, values) in decoded.items():
+            self.assertEqual(timestamps.tolist(), self.columns[key][0].tolist())
+            self.assertEqual(values.tolist(), self.columns[key][1].tolist())
+
+    def test_dump_data(self):
+        export.CHUNK_SIZE = 3
+        try:
+            series = TimeSeries(100)
+            for i in range(10):
+                series.append(i, i * 2)
+            data = {'1': {'a': series, 'b': TimeSeries(10)}, '2': {}}
+            chunks = list(dump_data(data))
+        finally:
+            export.CHUNK_SIZE = 10000
+        self.assertEqual(json.loads(''.join(chunks)),
+                         {'1': {'a': [{'timestamp': i, 'value': i * 2} for i in range(10)], 'b': []}, '2': {}})
+        self.assertGreater(len(chunks), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import threading
+import time
+
+
+class FakeSocketIO:
+    """
+    Records emitted events as (event, data, to) and sets sent after every emit.
+    """
+
+    def __init__(self):
+        self.emitted = []
+        self.sent = threading.Event()
+
+    def emit(self, event, data=None, to=None):
+        self.emitted.append((event, data, to))
+        self.sent.set()
+
+    def start_background_task(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
@@ -1,6 +1,12 @@
 import unittest
 
-from utils import DataPoint, add_data_point, get_data_points, filter_points
+from collections import deque
+
+import numpy as np
+
+from utils import DataPoint, add_data_point, get_data_points, filter_points, outlier_mask, \
+    largest_triangle_three_buckets, lttb_indices, tail, \
+    check_location_difference, decimate_trail, DISTANCE_MODES
 
 data1_1 = [1, 2, 1, 3, 1, 6, 5, 4, 1, 10, 3, 4, 2, 0, 8, 7, 8, 3, 5]
 data1_2 = [1, 1, 2, 3, 4, 5, 5, 1, 3, 2, 4, 2, 2, -15, 2, 2, 3, 4, 5, 1, 2, 3, 4, 5]
@@ -45,6 +51,50 @@ class TestHelpers(unittest.TestCase):
             b = filter_points(points)
             self.assertEqual(points, b)
 
+    def test_outfiltering_arrays(self):
+        for x, outlier in zip(data_with_outliers, outliers):
+            b = filter_points(np.array(x, dtype=float))
+            self.assertNotIn(outlier, b.tolist())
+        for x in data_without_outliers:
+            self.assertTrue(outlier_mask(x).all())
+
+    def test_lttb(self):
+        values = [0, 1, 0, 1, 0, 50, 0, 1, 0, 1, 0, -40, 0, 1, 0, 1]
+        points = [DataPoint(i, v) for i, v in enumerate(values)]
+        result = largest_triangle_three_buckets(points, 6)
+        self.assertEqual(len(result), 6)
+        self.assertEqual(result[0], points[0])
+        self.assertEqual(result[-1], points[-1])
+        self.assertIn(points[5], result)
+        self.assertIn(points[11], result)
+        indices = lttb_indices(range(len(values)), values, 6)
+        self.assertEqual([points[i] for i in indices], result)
+
+    def test_lttb_small_target(self):
+        self.assertEqual(lttb_indices([1, 2, 3], [1, 2, 3], 5).tolist(), [0, 1, 2])
+        self.assertEqual(lttb_indices([1, 2, 3, 4], [1, 2, 3, 4], 2).tolist(), [0, 3])
+
+    def test_tail(self):
+        history = deque(range(10), maxlen=5)
+        self.assertEqual(tail(history, 3), [7, 8, 9])
+        self.assertEqual(tail(history, 200), [5, 6, 7, 8, 9])
+        self.assertEqual(tail(list(range(10)), 2), [8, 9])
+
+    def test_location_difference(self):
+        # about 5.6 m north
+        location1 = {'lat': 50.0, 'lng': 20.0}
+        location2 = {'lat': 50.00005, 'lng': 20.0}
+        for mode in DISTANCE_MODES:
+            self.assertTrue(check_location_difference(location1, location2, 5, mode))
+            self.assertFalse(check_location_difference(location1, location2, 6, mode))
+        self.assertTrue(check_location_difference({}, location2, 5))
+        self.assertFalse(check_location_difference(location1, {}, 5))
+
+    def test_decimate_trail(self):
+        lats = [50.0, 50.00001, 50.00002, 50.0001, 50.00011, 50.0002]
+        lngs = [20.0] * len(lats)
+        for mode in DISTANCE_MODES:
+            self.assertEqual(decimate_trail(lats, lngs, 5, mode).tolist(), [0, 3, 5])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+import threading
+import unittest
+
+from models.ingest import IngestQueue
+
+
+class TestIngestQueue(unittest.TestCase):
+    def test_batches(self):
+        batches = []
+        ingest = IngestQueue(batches.append, queue_size=100, batch_size=4)
+        for i in range(10):
+            ingest.put(i)
+        ingest.start()
+        self.assertTrue(ingest.join(5))
+        ingest.stop()
+        self.assertEqual([x for batch in batches for x in batch], list(range(10)))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        stats = ingest.stats()
+        self.assertEqual((stats['processed'], stats['batches'], stats['maxBatchSize']), (10, 3, 4))
+
+    def test_drops_when_full(self):
+        release = threading.Event()
+        ingest = IngestQueue(lambda batch: release.wait(5), queue_size=2, batch_size=1)
+        for i in range(5):
+            ingest.put(i)
+        self.assertEqual(ingest.stats()['dropped'], 3)
+        self.assertEqual(ingest.stats()['queueDepth'], 2)
+        ingest.start()
+        release.set()
+        self.assertTrue(ingest.join(5))
+        ingest.stop()
+        self.assertEqual(ingest.stats()['processed'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
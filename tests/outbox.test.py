@@ -0,0 +1,99 @@
+import time
+import unittest
+
+from models.outbox import Outbox
+from models.session import Session
+from utils import TimeSeries
+from tests.fakes import FakeSocketIO
+
+
+class FakeTransport:
+    """
+    Stand-in for socketio.server with one client whose transport queue holds backlog packets.
+    """
+
+    def __init__(self):
+        self.backlog = 0
+        self.manager = self
+        self.eio = self
+        self.sockets = {'eio': self}
+        self.queue = self
+
+    def eio_sid_from_sid(self, sid, namespace):
+        return 'eio'
+
+    def qsize(self):
+        return self.backlog
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.socketio = FakeSocketIO()
+        self.resyncs = 0
+        self.outbox = Outbox(self.socketio, 'client', size=3, on_stale=self.resync)
+
+    def resync(self):
+        self.resyncs += 1
+
+    def test_stale_frames(self):
+        self.outbox.emit('charts/data', 1)
+        self.outbox.emit('maps/history', 'h')
+        self.outbox.emit('charts/data', 2)
+        self.outbox.emit('maps/data', 1)
+        self.outbox.emit('maps/data', 2)
+        self.assertEqual(list(self.outbox.pending), [['charts/data', 2], ['maps/history', 'h'], ['maps/data', 2]])
+        self.assertEqual(self.outbox.stale, 2)
+
+        # delta on top of a pending frame drops both and resyncs
+        self.outbox.emit('charts/delta', 3)
+        self.assertEqual(list(self.outbox.pending), [['maps/history', 'h'], ['maps/data', 2]])
+        self.assertEqual((self.outbox.stale, self.resyncs), (4, 1))
+
+        self.outbox.emit('maps/trail', 1)
+        self.outbox.emit('maps/trail', 2)
+        self.assertEqual(len(self.outbox.pending), 3)
+        self.assertEqual(self.outbox.overflows, 1)
+
+    def test_send(self):
+        self.outbox.start()
+        self.outbox.emit('charts/data', 1)
+        self.assertTrue(self.socketio.sent.wait(2))
+        self.outbox.stop()
+        self.assertEqual(self.socketio.emitted, [('charts/data', 1, 'client')])
+        self.assertEqual(self.outbox.stats()['sent'], 1)
+
+    def test_backlog(self):
+        self.socketio.server = FakeTransport()
+        self.socketio.server.backlog = 10
+        self.outbox.start()
+        for i in range(5):
+            self.outbox.emit('charts/data', i)
+        time.sleep(0.05)
+        # client is not reading, only the newest frame waits for it
+        self.assertEqual(self.socketio.emitted, [])
+        self.assertEqual(list(self.outbox.pending), [['charts/data', 4]])
+        self.socketio.server.backlog = 0
+        self.assertTrue(self.socketio.sent.wait(2))
+        self.outbox.stop()
+        self.assertEqual(self.socketio.emitted, [('charts/data', 4, 'client')])
+
+    def test_session_resync(self):
+        series = TimeSeries(100)
+        for i in range(10):
+            series.append(i, i)
+        data = {'origin': {'key': series}}
+        session = Session('client')
+        session.configure({'origins': {'origin': ['key']}, 'timeframe': 100, 'points': 100, 'incremental': True})
+        outbox = Outbox(self.socketio, 'client', on_stale=session.request_resync)
+
+        session.execute(data, outbox)
+        series.append(10, 10)
+        # client did not take the full frame yet, the delta is dropped with it and the next tick resyncs
+        session.execute(data, outbox)
+        self.assertEqual(len(outbox.pending), 0)
+        session.execute(data, outbox)
+        self.assertEqual([event for event, _ in outbox.pending], ['charts/data'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from models.profiles_handler import ProfilesHandler, ProfilesRouting, ProfilesConfigError
+from tests.fakes import FakeSocketIO
+
+
+class TestProfilesHandler(unittest.TestCase):
+    def setUp(self):
+        self.socketio = FakeSocketIO()
+        self.handler = ProfilesHandler('test', self.socketio, emit_interval=0)
+        self.handler.add_entities('20', 'a', [{'id': 'a-1'}, {'id': 'a-2'}])
+        self.handler.add_entities('20', 'b', [{'id': 'b-1'}])
+
+    def test_emit_changed(self):
+        self.handler.add_value('20', 'a', 1)
+        self.handler.add_value('20', 'a', 2)
+        self.handler.add_value('21', 'b', 3)
+        self.handler.emit(new=True)
+        self.assertEqual(self.socketio.emitted,
+                         [('profiles/test', [{'id': 'a-1', 'value': 2}, {'id': 'a-2', 'value': 2}], None)])
+        self.handler.emit(new=True)
+        self.assertEqual(len(self.socketio.emitted), 1)
+
+    def test_snapshot(self):
+        self.handler.add_value('20', 'b', 3)
+        self.handler.emit_snapshot(to='sid')
+        self.assertEqual(self.socketio.emitted[0][1],
+                         [{'id': 'a-1', 'value': None}, {'id': 'a-2', 'value': None}, {'id': 'b-1', 'value': 3}])
+        self.assertEqual(self.socketio.emitted[0][2], 'sid')
+
+    def test_coalescing(self):
+        self.handler.emit_interval = 60
+        self.handler.add_value('20', 'a', 1)
+        self.handler.emit(new=True)
+        self.handler.add_value('20', 'b', 2)
+        self.handler.emit(new=True)
+        self.assertEqual(len(self.socketio.emitted), 1)
+        self.handler.last_emit -= 60
+        self.handler.emit(new=True)
+        self.assertEqual(self.socketio.emitted[1][1], [{'id': 'b-1', 'value': 2}])
+
+    def test_routing(self):
+        other = ProfilesHandler('other', self.socketio, emit_interval=0)
+        other.add_entities('20', 'a', [{'id': 'other-a'}])
+        routing = ProfilesRouting([self.handler, other])
+        routing.route('20', 'a', 5)
+        routing.route('20', 'c', 6)
+        self.assertEqual(set(routing.routes), {('20', 'a'), ('20', 'b')})
+        self.assertEqual(other.values['20.a'], [{'id': 'other-a', 'value': 5}])
+        self.assertEqual(list(self.handler.changed), ['20.a'])
+
+    def test_get_handlers(self):
+        routing = ProfilesHandler.get_handlers('profiles-config.json', self.socketio)
+        self.assertEqual({handler.profile_id for handler in routing.handlers}, {'test', 'bi-liquid'})
+        self.assertIn(('20', 'cpuTemperature.value'), routing.routes)
+        self.assertIn(('30', 'battery_3v3.scaled'), routing.routes)
+
+    def test_get_handlers_raises_on_config_errors(self):
+        with self.assertRaises(ProfilesConfigError):
+            ProfilesHandler.get_handlers('missing-profiles-config.json', self.socketio)
+
+
+if __name__ == "__main__":
+    unittest.main()
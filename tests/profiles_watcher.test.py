@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+
+from models.profiles_watcher import ProfilesWatcher
+from tests.fakes import FakeSocketIO
+
+
+class TestProfilesWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.directory.name, 'profiles-config.json')
+        self.imported = os.path.join(self.directory.name, 'imported.json')
+        self.write(self.config, {'imports': [self.imported], '20': {'a': {'main': {'id': 'a-1'}}}})
+        self.write(self.imported, {'30': {'b': {'main': {'id': 'b-1'}}}})
+        self.socketio = FakeSocketIO()
+        self.watcher = ProfilesWatcher(self.config, self.socketio, poll_interval=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, filename, config, mtime=None):
+        with open(filename, 'w') as f:
+            f.write(json.dumps(config) if isinstance(config, dict) else config)
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+
+    def test_reload(self):
+        profiles = self.watcher.poll()
+        self.assertEqual(set(profiles.routes), {('20', 'a'), ('30', 'b')})
+        profiles.route('30', 'b', 5)
+        self.assertIsNone(self.watcher.poll(profiles))
+
+        self.write(self.imported, {'30': {'b': {'main': {'id': 'b-1'}}, 'c': {'main': {'id': 'c-1'}}}}, 1)
+        config_parsed = self.watcher.files[self.config][1]
+        reloaded = self.watcher.poll(profiles)
+        self.assertEqual(set(reloaded.routes), {('20', 'a'), ('30', 'b'), ('30', 'c')})
+        self.assertIs(self.watcher.files[self.config][1], config_parsed)
+        self.assertEqual(reloaded.handlers[0].values['30.b'], [{'id': 'b-1', 'value': 5}])
+
+    def test_errors(self):
+        profiles = self.watcher.poll()
+        self.write(self.imported, '{"30": ', 1)
+        self.assertIsNone(self.watcher.poll(profiles))
+        self.assertEqual(self.socketio.emitted[0][0], 'profiles/error')
+        self.assertIsNone(self.watcher.poll(profiles))
+
+        os.remove(self.imported)
+        self.assertIsNone(self.watcher.poll(profiles))
+        self.assertIn('not found', self.socketio.emitted[-1][1])
+
+        self.write(self.imported, {'30': {'d': {'main': {'id': 'd-1'}}}}, 2)
+        self.assertEqual(set(self.watcher.poll(profiles).routes), {('20', 'a'), ('30', 'd')})
+
+
+if __name__ == "__main__":
+    unittest.main()
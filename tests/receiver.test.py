@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from models import MqttReceiver, Session
+from tests.fakes import FakeSocketIO
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app_config.json')
+
+
+class ReceiverTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = MqttReceiver(CONFIG, profiles_config=None, connect=False)
+        self.switch_interval = sys.getswitchinterval()
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+        self.receiver.running = False
+        self.receiver.ingest.stop()
+
+    def test_raw_values_delta(self):
+        socketio = FakeSocketIO()
+        self.receiver.apply_message('20', 1000, {'speed': 1, 'state': 'driving'})
+        self.receiver.apply_message('21', 1000, {'speed': 2})
+        self.receiver.publish()
+        self.receiver.emit_raw_values(socketio)
+        event, delta, to = socketio.emitted[-1]
+        self.assertEqual((event, to), ('raw/delta', None))
+        self.assertEqual({origin: [key['name'] for key in value['keys']] for origin, value in delta.items()},
+                         {'20': ['speed', 'state'], '21': ['speed']})
+
+        # only changed keys of changed origins are broadcast
+        self.receiver.apply_message('20', 1001, {'speed': 3})
+        self.receiver.publish()
+        self.receiver.emit_raw_values(socketio)
+        event, delta, _ = socketio.emitted[-1]
+        self.assertEqual(list(delta), ['20'])
+        self.assertEqual([(key['name'], key['value']) for key in delta['20']['keys']], [('speed', 3)])
+
+        # nothing is sent without changes
+        self.receiver.emit_raw_values(socketio)
+        self.assertEqual(len(socketio.emitted), 2)
+
+        # raw/data sent on connect and on request has every key
+        raw_data = self.receiver.get_raw_values()
+        self.assertEqual({origin: {key['name']: key['value'] for key in value['keys']}
+                          for origin, value in raw_data.items()},
+                         {'20': {'speed': 3, 'state': 'driving'}, '21': {'speed': 2}})
+
+    def test_configure_locations_while_ingesting(self):
+        self.receiver.add_location_to_history('20', {'lat': 50, 'lng': 19})
+        self.receiver.publish()
+        session = Session('test')
+        sys.setswitchinterval(1e-6)
+
+        def ingest():
+            for i in range(200000):
+                self.receiver.add_location_to_history('20', {'lat': 50 + i * 1e-5, 'lng': 19})
+
+        thread = threading.Thread(target=ingest)
+        thread.start()
+        while thread.is_alive():
+            history = self.receiver.configure_locations(session, ['20'])
+            self.assertLessEqual(len(history['20']), 200)
+        thread.join()
+        self.assertEqual(self.receiver.configure_locations(session, ['20'])['20'][-1]['lat'], 50 + 199999 * 1e-5)
+
+    def test_single_ingest_worker(self):
+        with open(CONFIG, encoding='utf-8') as f:
+            config = json.load(f)
+        config['ingest']['workers'] = 2
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(config, f)
+        try:
+            with self.assertRaises(ValueError):
+                MqttReceiver(f.name, profiles_config=None, connect=False)
+        finally:
+            os.remove(f.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+from models.recorder import Recorder
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_record_and_read(self):
+        recorder = Recorder(self.directory.name, segment_size=16 * 4)
+        for i in range(10):
+            recorder.record('20', 'a', i, i * 10)
+            recorder.record('20', 'b', i, -i)
+            if i % 3 == 2:
+                recorder.flush()
+        recorder.flush()
+        self.assertGreater(len(recorder.segments), 1)
+
+        timestamps, values = recorder.read('20', 'a', 2.5, 7)
+        self.assertEqual(timestamps.tolist(), [3, 4, 5, 6, 7])
+        self.assertEqual(values.tolist(), [30, 40, 50, 60, 70])
+        self.assertEqual(recorder.read('20', 'b', -1, 1)[1].tolist(), [0, -1])
+        self.assertEqual(len(recorder.read('21', 'a', -1, 100)[0]), 0)
+
+        reopened = Recorder(self.directory.name)
+        self.assertEqual(reopened.read('20', 'a', -1, 100)[0].tolist(), list(range(10)))
+
+    def test_payloads(self):
+        recorder = Recorder(self.directory.name, payloads=True)
+        recorder.record_payload('pcc/in', b'{"a": 1}')
+        recorder.record_payload('pcc/in/binary', b'\xb5\x00')
+        recorder.flush()
+        payloads = [(topic, payload) for _, topic, payload in Recorder(self.directory.name).read_payloads()]
+        self.assertEqual(payloads, [('pcc/in', b'{"a": 1}'), ('pcc/in/binary', b'\xb5\x00')])
+
+
+if __name__ == "__main__":
+    unittest.main()
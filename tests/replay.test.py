@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+
+from models.ingest import IngestQueue
+from models.recorder import Recorder
+from models.replay import Replay
+from utils import StageTimer
+
+
+class FakeReceiver:
+    def __init__(self):
+        self.timer = StageTimer()
+        self.payloads = []
+        self.messages = []
+        self.ingest = IngestQueue(lambda batch: self.payloads.extend(msg.payload for msg in batch), queue_size=2)
+        self.ingest.start()
+
+    def apply_message(self, origin, timestamp, parsed):
+        self.messages.append((origin, timestamp, parsed))
+
+    def publish(self):
+        pass
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.receiver = FakeReceiver()
+
+    def tearDown(self):
+        self.receiver.ingest.stop()
+        self.directory.cleanup()
+
+    def test_payloads(self):
+        recorder = Recorder(self.directory.name, payloads=True)
+        for i in range(10):
+            recorder.record_payload('pcc/in', str(i).encode())
+        recorder.flush()
+        replay = Replay(self.receiver, self.directory.name, speed=0)
+        replay.run()
+        self.assertEqual(replay.messages, 10)
+        self.assertEqual(self.receiver.payloads, [str(i).encode() for i in range(10)])
+        self.assertEqual(self.receiver.ingest.stats()['dropped'], 0)
+        self.assertIn('messages/s', replay.report())
+
+    def test_samples(self):
+        recorder = Recorder(self.directory.name)
+        for i in range(3):
+            recorder.record('20', 'a', i, i)
+            recorder.record('21', 'a', i, -i)
+            recorder.record('20', 'b', i, i * 10)
+        recorder.flush()
+        replay = Replay(self.receiver, self.directory.name, speed=0)
+        replay.run()
+        self.assertEqual(replay.messages, 6)
+        self.assertEqual(self.receiver.messages[:3], [('20', 0, {'a': 0, 'b': 0}), ('21', 0, {'a': 0}),
+                                                      ('20', 1, {'a': 1, 'b': 10})])
+        self.assertEqual(self.receiver.timer.stats()['apply']['count'], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from models.scheduler import EmitScheduler
+from utils import StageTimer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEmitScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.timer = StageTimer()
+        self.scheduler = EmitScheduler(self.timer, self.clock)
+        self.calls = []
+
+    def callback(self, name, duration=0.0):
+        def run():
+            self.calls.append((name, self.clock.now))
+            self.clock.now += duration
+        return run
+
+    def run_until(self, end, step=0.01):
+        while self.clock.now < end:
+            self.scheduler.run_pending()
+            self.clock.now = round(self.clock.now + step, 6)
+
+    def test_rates(self):
+        self.scheduler.add('fast', 0.1, self.callback('fast'))
+        self.scheduler.add('slow', 1.0, self.callback('slow'))
+        self.run_until(2.0)
+        self.assertEqual(len([c for c in self.calls if c[0] == 'fast']), 20)
+        self.assertEqual([t for name, t in self.calls if name == 'slow'], [0, 1.0])
+        self.assertEqual(self.scheduler.stats()['fast']['overruns'], 0)
+
+    def test_processing_time_compensated(self):
+        # 30 ms of work every 100 ms tick does not stretch the period
+        self.scheduler.add('charts', 0.1, self.callback('charts', 0.03))
+        self.run_until(1.0)
+        self.assertEqual(len(self.calls), 10)
+        self.assertAlmostEqual(self.calls[-1][1], 0.9)
+        self.assertEqual(self.timer.stats()['charts']['count'], 10)
+
+    def test_overrun(self):
+        self.scheduler.add('slow', 0.1, self.callback('slow', 0.25))
+        self.scheduler.run_pending()
+        stats = self.scheduler.stats()['slow']
+        self.assertEqual((stats['overruns'], stats['skipped']), (1, 2))
+        # missed deadlines are skipped, next tick is on the 0.1 grid
+        self.assertAlmostEqual(self.scheduler.run_pending(), 0.05)
+
+    def test_failing_callback(self):
+        def fail():
+            raise ValueError("failed")
+        self.scheduler.add('failing', 0.1, fail)
+        self.scheduler.add('ok', 0.1, self.callback('ok'))
+        self.run_until(0.3)
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(self.scheduler.stats()['failing']['ticks'], 3)
+
+    def test_set_interval_and_remove(self):
+        self.scheduler.add('session', 1.0, self.callback('session'))
+        self.scheduler.run_pending()
+        self.clock.now = 0.1
+        self.scheduler.set_interval('session', 0.2)
+        self.run_until(0.75)
+        self.assertEqual([round(t, 1) for _, t in self.calls], [0, 0.3, 0.5, 0.7])
+        self.scheduler.remove('session')
+        self.run_until(2.0)
+        self.assertEqual(len(self.calls), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
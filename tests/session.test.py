@@ -0,0 +1,106 @@
+import unittest
+
+from models.chart_cache import ChartCache
+from models.session import Session, get_series_points, rollup_min_samples
+from utils import TimeSeries, filter_points, get_data_points, largest_triangle_three_buckets
+from utils.emit_policy import KeepEveryNth
+from tests.fakes import FakeSocketIO
+
+values = [1, 2, 1, 3, 1, 6, 5, 4, 1, 10, 3, 4, 2, 0, 8, 7, 8, 3, 5, 1, 1, 2, 3, 4, 5, 5, 1, 3, 2, 4, 2, 2, -15, 2]
+
+
+class TestSession(unittest.TestCase):
+    def test_window_first(self):
+        series = TimeSeries(100)
+        for i, value in enumerate(values):
+            series.append(i, value)
+        data = {'origin': {'key': series}}
+
+        for timeframe in [3, 5.5, 10, 20, 40]:
+            session = Session('test')
+            session.configure({'origins': {'origin': ['key']}, 'timeframe': timeframe, 'points': 1000})
+            points = filter_points(series.to_list())
+            points = get_data_points(points, series.last_timestamp - timeframe)
+            points = largest_triangle_three_buckets(points, 1000)
+            expected = [[p.timestamp, p.value] for p in points]
+            self.assertEqual(session.get_points(data)['origin']['key'], expected)
+
+    def test_rollup(self):
+        # 700 s at 100 Hz, a single sample glitch and a spike of a few samples
+        series = TimeSeries(100000, resolutions=[1, 10, 60])
+        for i in range(70000):
+            value = i % 2
+            if i == 20000:
+                value = 1e6
+            elif 40000 <= i < 40005:
+                value = 50
+            series.append(i / 100, value)
+        self.assertEqual(series.get_rollup(100, 10, rollup_min_samples), series.rollups[2])
+
+        points = get_series_points(series, 600, 10)
+        self.assertEqual(len(points), 10)
+        # the newest point is the newest sample, not the start of the open bucket
+        self.assertEqual(points[-1], [699.99, 1])
+        self.assertEqual(max(v for _, v in points), 50)
+        self.assertEqual(series.rollups[0].window_stats(199, 200)['max'].tolist(), [1])
+
+        # origins with emit policy are drawn from their samples
+        points = get_series_points(series, 600, 10, KeepEveryNth(7))
+        self.assertTrue(all(round(t * 100) % 7 == 0 for t, _ in points))
+
+        # short windows are drawn from samples
+        self.assertIsNone(series.get_rollup(600, 20, rollup_min_samples))
+
+    def test_shared_cache(self):
+        series = TimeSeries(100)
+        for i, value in enumerate(values):
+            series.append(i, value)
+        data = {'origin': {'key': series}}
+        cache = ChartCache()
+        sessions = [Session(str(i)) for i in range(3)]
+        for session in sessions:
+            session.configure({'origins': {'origin': ['key']}, 'timeframe': 10, 'points': 5})
+        results = [session.get_points(data, cache) for session in sessions]
+        self.assertEqual(results[0], sessions[0].get_points(data))
+        self.assertIs(results[0]['origin']['key'], results[2]['origin']['key'])
+        self.assertEqual((cache.misses, cache.hits), (1, 2))
+
+        cache.evict()
+        series.append(len(values), 1)
+        sessions[0].get_points(data, cache)
+        cache.evict()
+        self.assertEqual(len(cache.entries), 1)
+        cache.evict()
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_incremental(self):
+        series = TimeSeries(100)
+        for i, value in enumerate(values):
+            series.append(i, value)
+        data = {'origin': {'key': series}}
+        socketio = FakeSocketIO()
+        session = Session('test')
+        session.configure({'origins': {'origin': ['key']}, 'timeframe': 100, 'points': 100, 'incremental': True,
+                           'resync': 3})
+
+        session.execute(data, socketio)
+        self.assertEqual(socketio.emitted.pop()[0], 'charts/data')
+        session.execute(data, socketio)
+        self.assertEqual(socketio.emitted, [])
+
+        series.append(len(values), 3)
+        series.append(len(values) + 1, 4)
+        session.execute(data, socketio)
+        event, delta, _ = socketio.emitted.pop()
+        self.assertEqual(event, 'charts/delta')
+        self.assertEqual(delta['origin']['key']['from'], len(values) - 1)
+        self.assertEqual(delta['origin']['key']['points'][-2:], [[len(values), 3], [len(values) + 1, 4]])
+
+        session.execute(data, socketio)
+        self.assertEqual(socketio.emitted, [])
+        session.execute(data, socketio)
+        self.assertEqual(socketio.emitted.pop()[0], 'charts/data')
+
+
+if __name__ == "__main__":
+    unittest.main()
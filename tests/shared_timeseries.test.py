@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+
+from utils import SharedTimeSeries
+
+
+class SharedTimeSeriesTest(unittest.TestCase):
+    def setUp(self):
+        self.writer = SharedTimeSeries(100, None, (1, 10), 50, 10)
+
+    def tearDown(self):
+        self.writer.unlink()
+
+    def append(self, start, count):
+        for i in range(start, start + count):
+            self.writer.append(i * 0.1, float(i))
+
+    def test_no_block_before_first_sample(self):
+        series = SharedTimeSeries(100)
+        self.assertIsNone(series.name)
+        self.assertFalse(series.share())
+
+    def test_reader_sees_shared_samples(self):
+        self.append(0, 250)
+        self.assertTrue(self.writer.share())
+        self.assertFalse(self.writer.share())
+
+        reader = SharedTimeSeries.attach(*self.writer.layout())
+        self.assertEqual(len(reader), 100)
+        self.assertEqual(reader.total, 250)
+        np.testing.assert_array_equal(reader.arrays()[0], self.writer.arrays()[0][-100:])
+        np.testing.assert_array_equal(reader.arrays()[1], self.writer.arrays()[1][-100:])
+
+    def test_reader_sees_rollups(self):
+        self.append(0, 250)
+        self.writer.share()
+        reader = SharedTimeSeries.attach(*self.writer.layout())
+
+        self.assertEqual([rollup.resolution for rollup in reader.rollups], [1, 10])
+        for written, read in zip(self.writer.rollups, reader.rollups):
+            expected, actual = written.window_stats(-1), read.window_stats(-1)
+            for column in expected:
+                np.testing.assert_array_equal(actual[column], expected[column][-50:])
+        self.assertIs(reader.get_rollup(0, 5), reader.rollups[0])
+
+    def test_reader_keeps_state_until_refresh(self):
+        self.append(0, 10)
+        self.writer.share()
+        reader = SharedTimeSeries.attach(*self.writer.layout())
+
+        self.append(10, 5)
+        self.assertEqual(reader.total, 10)
+        self.assertEqual(reader.last_timestamp, 0.9)
+
+        self.writer.share()
+        reader.refresh()
+        self.assertEqual(reader.total, 15)
+        self.assertEqual(len(reader), 15)
+        self.assertAlmostEqual(reader.last_timestamp, 1.4)
+
+    def test_needs_share_after_guard_samples(self):
+        self.append(0, 9)
+        self.assertFalse(self.writer.needs_share())
+        self.append(9, 1)
+        self.assertTrue(self.writer.needs_share())
+        self.writer.share()
+        self.assertFalse(self.writer.needs_share())
+
+    def test_writer_keeps_shared_samples_of_wrapped_ring(self):
+        writer = SharedTimeSeries(10, None, (), 10, 3)
+        for i in range(20):
+            writer.append(i, float(i))
+        writer.share()
+        reader = SharedTimeSeries.attach(*writer.layout())
+        self.assertEqual(reader.timestamps.tolist(), list(range(10, 20)))
+
+        for i in range(20, 23):
+            writer.append(i, float(i))
+        self.assertEqual(reader.timestamps.tolist(), list(range(10, 20)))
+        self.assertEqual(reader.bisect(14.5), 5)
+        writer.unlink()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from models.snapshot import publish_raw_values, raw_delta, changed_keys, apply_raw_delta
+
+
+def raw_value(origin, **keys):
+    return {
+        'name': origin,
+        'displayName': origin,
+        'timestamp': 1.0,
+        'keys': {key: {'name': key, 'displayName': key, 'value': value} for key, value in keys.items()},
+    }
+
+
+class PublishRawValuesTest(unittest.TestCase):
+    def test_copies_only_changed_keys(self):
+        working = {'20': raw_value('20', speed=1, temp=2), '21': raw_value('21', speed=3)}
+        published = publish_raw_values({}, working, {'20': {'speed': None, 'temp': None}, '21': {'speed': None}})
+
+        working['20']['keys']['speed']['value'] = 5
+        current = publish_raw_values(published, working, {'20': {'speed': None}})
+
+        self.assertEqual(current['20']['keys']['speed']['value'], 5)
+        self.assertEqual(published['20']['keys']['speed']['value'], 1)
+        self.assertIs(current['20']['keys']['temp'], published['20']['keys']['temp'])
+        self.assertIs(current['21'], published['21'])
+
+    def test_published_values_are_not_shared_with_working(self):
+        working = {'20': raw_value('20', speed=1)}
+        published = publish_raw_values({}, working, {'20': {'speed': None}})
+        working['20']['keys']['speed']['value'] = 2
+        self.assertEqual(published['20']['keys']['speed']['value'], 1)
+
+
+class DeltaTest(unittest.TestCase):
+    def test_raw_delta_contains_only_published_keys(self):
+        working = {'20': raw_value('20', speed=1, temp=2), '21': raw_value('21', speed=3)}
+        previous = publish_raw_values({}, working, {'20': {'speed': None, 'temp': None}, '21': {'speed': None}})
+        working['20']['keys']['temp']['value'] = 4
+        current = publish_raw_values(previous, working, {'20': {'temp': None}})
+
+        delta = raw_delta(previous, current)
+        self.assertEqual(list(delta), ['20'])
+        self.assertEqual(delta['20']['keys'], [{'name': 'temp', 'displayName': 'temp', 'value': 4}])
+        self.assertEqual(raw_delta(current, current), {})
+
+    def test_raw_delta_from_empty(self):
+        current = publish_raw_values({}, {'20': raw_value('20', speed=1)}, {'20': {'speed': None}})
+        self.assertEqual(len(raw_delta({}, current)['20']['keys']), 1)
+
+    def test_apply_raw_delta_restores_current(self):
+        working = {'20': raw_value('20', speed=1, temp=2)}
+        previous = publish_raw_values({}, working, {'20': {'speed': None, 'temp': None}})
+        working['20']['keys']['temp']['value'] = 4
+        working['21'] = raw_value('21', speed=3)
+        current = publish_raw_values(previous, working, {'20': {'temp': None}, '21': {'speed': None}})
+
+        applied = apply_raw_delta(previous, raw_delta(previous, current))
+        self.assertEqual(applied, current)
+        self.assertIs(applied['20']['keys']['speed'], previous['20']['keys']['speed'])
+        self.assertEqual(raw_delta(previous, applied), raw_delta(previous, current))
+
+    def test_changed_keys(self):
+        point = {'lat': 1, 'lng': 2}
+        previous = {'20': point, '21': {'lat': 3, 'lng': 4}}
+        current = {'20': point, '21': {'lat': 3, 'lng': 4}, '22': {'lat': 5, 'lng': 6}}
+        self.assertEqual(changed_keys(previous, current), ['21', '22'])
+
+
+if __name__ == '__main__':
+    unittest.main()
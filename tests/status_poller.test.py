@@ -0,0 +1,94 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from models.status_poller import StatusPoller
+from tests.fakes import FakeSocketIO
+
+
+class StatusApp(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.clients.add(self.client_address)
+        if server.fail:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps(server.status).encode()
+        etag = f'"{server.version}"'
+        if server.etags and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if server.etags:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestStatusPoller(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StatusApp)
+        self.server.clients = set()
+        self.server.fail = False
+        self.server.etags = True
+        self.server.status = {'pump': 'ok'}
+        self.server.version = 1
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.poller = StatusPoller(f'http://127.0.0.1:{self.server.server_address[1]}/', timeout=5)
+        self.socketio = FakeSocketIO()
+
+    def tearDown(self):
+        self.poller.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def set_status(self, status):
+        self.server.status = status
+        self.server.version += 1
+
+    def test_conditional_requests(self):
+        self.assertTrue(self.poller.poll(self.socketio))
+        self.assertFalse(self.poller.poll(self.socketio))
+        self.set_status({'pump': 'failed'})
+        self.assertTrue(self.poller.poll(self.socketio))
+        self.assertEqual([data for _, data, _ in self.socketio.emitted], [{'pump': 'ok'}, {'pump': 'failed'}])
+        self.assertEqual(self.poller.not_modified, 1)
+        # one keep-alive connection for all polls
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_unchanged_without_etags(self):
+        self.server.etags = False
+        self.assertTrue(self.poller.poll(self.socketio))
+        self.set_status({'pump': 'ok'})
+        self.assertFalse(self.poller.poll(self.socketio))
+        self.assertEqual((self.poller.unchanged, len(self.socketio.emitted)), (1, 1))
+
+        self.poller.emit_status(self.socketio, 'client')
+        self.assertEqual(self.socketio.emitted[-1], ('statuses/data', {'pump': 'ok'}, 'client'))
+
+    def test_backoff(self):
+        self.server.fail = True
+        self.assertRaises(ValueError, self.poller.poll, self.socketio)
+        self.poller.backoff = 1
+        self.poller.max_backoff = 10
+        for failures, limit in [(1, 1), (2, 2), (4, 8), (5, 10), (100, 10)]:
+            self.poller.failures = failures
+            delays = [self.poller.retry_delay() for _ in range(100)]
+            self.assertTrue(all(0 <= delay <= limit for delay in delays))
+            self.assertGreater(max(delays), limit / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+from utils import TimeSeries, Rollup, filter_points, get_data_points
+
+
+class TestTimeSeries(unittest.TestCase):
+    def test_append(self):
+        series = TimeSeries(4)
+        for i in range(3):
+            series.append(i, i * 10)
+        self.assertEqual(len(series), 3)
+        self.assertEqual([[p.timestamp, p.value] for p in series], [[0, 0], [1, 10], [2, 20]])
+        self.assertEqual(series[-1].value, 20)
+
+    def test_ring(self):
+        series = TimeSeries(4)
+        for i in range(10):
+            series.append(i, i)
+        self.assertEqual(len(series), 4)
+        self.assertEqual(series.total, 10)
+        self.assertEqual(series.timestamps.tolist(), [6, 7, 8, 9])
+        self.assertEqual([p.value for p in series[1:3]], [7, 8])
+
+    def test_retention(self):
+        series = TimeSeries(100, retention=5)
+        for i in range(20):
+            series.append(i, i)
+        self.assertEqual(series.timestamps.tolist(), [14, 15, 16, 17, 18, 19])
+
+    def test_window(self):
+        series = TimeSeries(8)
+        for i in range(13):
+            series.append(i, i)
+        for start in range(3, 14):
+            timestamps, _ = series.window(start + 0.5)
+            self.assertEqual(timestamps.tolist(), [t for t in range(5, 13) if t > start + 0.5])
+        timestamps, values = series.window(6, 9)
+        self.assertEqual(timestamps.tolist(), [7, 8, 9])
+        self.assertEqual(values.tolist(), [7, 8, 9])
+
+    def test_list_compatibility(self):
+        series = TimeSeries(50)
+        for i, value in enumerate([1, 2, 1, 3, 1, 6, 5, 4, 1, 10, 3, 4, 2, 0, 8, 7, 8, 3, 5]):
+            series.append(i, value)
+        self.assertNotIn(10, [p.value for p in filter_points(series.to_list())])
+        self.assertEqual([p.timestamp for p in get_data_points(series, 16.5)], [17, 18])
+
+    def test_rollup(self):
+        rollup = Rollup(10, 3)
+        for t, v in [(1, 4), (5, 2), (9, 6), (12, 1), (25, 3), (31, 5), (38, 7)]:
+            rollup.append(t, v)
+        self.assertEqual(len(rollup), 3)
+        stats = rollup.window_stats(0)
+        self.assertEqual(stats['timestamps'].tolist(), [10, 20, 30])
+        self.assertEqual(stats['min'].tolist(), [1, 3, 5])
+        self.assertEqual(stats['max'].tolist(), [1, 3, 7])
+        self.assertEqual(stats['mean'].tolist(), [1, 3, 6])
+        self.assertEqual(stats['count'].tolist(), [1, 1, 2])
+        self.assertEqual(rollup.window_stats(15)['timestamps'].tolist(), [20, 30])
+
+    def test_get_rollup(self):
+        series = TimeSeries(10000, resolutions=[10, 1])
+        for t in range(1000):
+            series.append(t / 10, t)
+        self.assertEqual([rollup.resolution for rollup in series.rollups], [1, 10])
+        self.assertEqual(series.get_rollup(0, 5).resolution, 10)
+        self.assertEqual(series.get_rollup(0, 50).resolution, 1)
+        # window too small to have enough buckets, or not more samples than requested points
+        self.assertIsNone(series.get_rollup(90, 50))
+        self.assertIsNone(series.get_rollup(0, 1000))
+        self.assertEqual(series.rollups[1].window_stats(0)['count'].tolist()[:2], [100, 100])
+
+    def test_read_while_appending(self):
+        series = TimeSeries(100)
+        series.append(0, 1)
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+        def append():
+            # value of every sample is its timestamp + 1, and its timestamp is its index
+            for i in range(1, 200000):
+                series.append(i, i + 1)
+
+        thread = threading.Thread(target=append)
+        thread.start()
+        try:
+            while thread.is_alive():
+                timestamps, values = series.arrays()
+                np.testing.assert_array_equal(values, timestamps + 1)
+                np.testing.assert_array_equal(np.diff(timestamps), 1)
+                index, timestamps, values = series.since(timestamps[-1] - 10, 2)
+                np.testing.assert_array_equal(values, timestamps + 1)
+                self.assertEqual(index, timestamps[0])
+                point = series[0]
+                self.assertEqual(point.value, point.timestamp + 1)
+        finally:
+            thread.join()
+            sys.setswitchinterval(switch_interval)
+
+
+if __name__ == "__main__":
+    unittest.main()
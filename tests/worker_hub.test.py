@@ -0,0 +1,157 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from models import MqttReceiver, Session, WorkerHub, WorkerReceiver
+from models.worker_hub import encode_message, recv_message
+from tests.fakes import FakeSocketIO
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app_config.json')
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+class FramingTest(unittest.TestCase):
+    def test_messages_survive_partial_reads(self):
+        left, right = socket.socketpair()
+        messages = [('state', {'version': i, 'shared': ['a' * i]}) for i in range(50)]
+        threading.Thread(target=lambda: [left.sendall(encode_message(m)) for m in messages], daemon=True).start()
+        self.assertEqual([recv_message(right) for _ in messages], messages)
+        left.close()
+        with self.assertRaises(EOFError):
+            recv_message(right)
+        right.close()
+
+
+class WorkerHubTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.receiver = MqttReceiver(CONFIG, profiles_config=None, connect=False, shared=True)
+        self.hub = WorkerHub(self.receiver, os.path.join(self.directory, 'hub.sock'))
+        self.hub.start()
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.running = False
+            worker.connection.close()
+        self.receiver.running = False
+        self.receiver.ingest.stop()
+        self.hub.close()
+        shutil.rmtree(self.directory)
+
+    def start_worker(self):
+        worker = WorkerReceiver(CONFIG, self.hub.address)
+        worker.socketio = FakeSocketIO()
+        threading.Thread(target=worker.listen, daemon=True).start()
+        self.workers.append(worker)
+        return worker
+
+    def ingest(self, start, count):
+        for i in range(start, start + count):
+            self.receiver.apply_message('20', 1000 + i * 0.1, {
+                'speed': i % 7,
+                'state': 'driving',
+                'location.latitude': 50 + i * 0.001,
+                'location.longitude': 19.0,
+            })
+        self.receiver.publish()
+
+    def wait_for_sync(self, worker):
+        wait_until(lambda: worker.snapshot.version == self.receiver.snapshot.version)
+
+    def assert_mirrored(self, worker):
+        self.assertEqual(worker.get_origins(), self.receiver.get_origins())
+        self.assertEqual(worker.get_raw_values(), self.receiver.get_raw_values())
+        self.assertEqual(worker.get_locations(), self.receiver.get_locations())
+        self.assertEqual(worker.get_location_origins(), self.receiver.get_location_origins())
+        self.assertEqual(worker.snapshot.trail_points, self.receiver.snapshot.trail_points)
+        self.assertEqual({origin: list(history) for origin, history in worker.location_history.items()},
+                         {origin: list(history) for origin, history in self.receiver.location_history.items()})
+
+        session = Session('test')
+        session.configure({'origins': {'20': ['speed', 'state']}, 'timeframe': 10, 'points': 50})
+        self.assertEqual(session.get_points(worker.data), session.get_points(self.receiver.data))
+
+    def test_worker_mirrors_published_state(self):
+        worker = self.start_worker()
+        self.ingest(0, 200)
+        self.wait_for_sync(worker)
+        self.assert_mirrored(worker)
+
+        self.ingest(200, 50)
+        self.wait_for_sync(worker)
+        self.assert_mirrored(worker)
+        self.assertEqual(worker.data['20']['speed'].total, 250)
+
+    def test_series_are_shared_every_guard_samples(self):
+        shared_totals = []
+        self.receiver.publish_listeners.append(
+            lambda previous, snapshot, history: shared_totals.append(snapshot.data['20']['speed'].shared_total))
+        # one batch of more samples than the guard of 1000 kept by the writer for workers
+        self.ingest(0, 2500)
+        self.assertEqual(shared_totals, [1000, 2000, 2500])
+
+    def test_late_worker_gets_whole_state(self):
+        self.ingest(0, 100)
+        worker = self.start_worker()
+        self.wait_for_sync(worker)
+        self.assert_mirrored(worker)
+
+        self.ingest(100, 10)
+        self.wait_for_sync(worker)
+        self.assert_mirrored(worker)
+        self.assertEqual(len(worker.location_history['20']), 110)
+
+    def test_raw_delta_of_worker_has_changed_keys_only(self):
+        worker = self.start_worker()
+        self.ingest(0, 1)
+        self.wait_for_sync(worker)
+        worker.emit_raw_values(worker.socketio)
+
+        self.receiver.apply_message('20', 2000, {'speed': 3})
+        self.receiver.publish()
+        self.wait_for_sync(worker)
+        worker.emit_raw_values(worker.socketio)
+        event, delta, _ = worker.socketio.emitted[-1]
+        self.assertEqual(event, 'raw/delta')
+        self.assertEqual([key['name'] for key in delta['20']['keys']], ['speed'])
+
+    def test_emits_and_requests(self):
+        worker = self.start_worker()
+        wait_until(lambda: self.hub.connections)
+        self.hub.emit('profiles', {'id': 'test'}, to='session')
+        wait_until(lambda: worker.socketio.emitted)
+        self.assertEqual(worker.socketio.emitted, [('profiles', {'id': 'test'}, 'session')])
+
+        worker.report_stats()
+        wait_until(lambda: os.getpid() in self.hub.worker_stats)
+        self.assertEqual(self.hub.stats()['workers'][os.getpid()]['sessions'], 0)
+
+    def test_slow_worker_does_not_block_ingest(self):
+        self.hub.send_queue = 5
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(self.hub.address)
+        wait_until(lambda: self.hub.connections)
+
+        started = time.monotonic()
+        for _ in range(50):
+            self.hub.emit('profiles', 'a' * 1000000)
+        self.assertLess(time.monotonic() - started, 1.0)
+        wait_until(lambda: not self.hub.connections)
+        self.assertEqual(self.hub.dropped, 1)
+        stalled.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
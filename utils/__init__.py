@@ -1,2 +1,8 @@
 from .helpers import *
-from .config import Config
+from .timeseries import TimeSeries, Rollup, DataType
+from .shared_timeseries import SharedTimeSeries, attach_memory
+from .emit_policy import EmitPolicy, get_emit_policy
+from .decoding import loads, ShapeFlattener, PayloadDecoder, JSON_BACKEND, STRUCT_HEADER, STRUCT_MAGIC
+from .metrics import StageTimer
+from .export import downsample, dump_data, decode_binary, ENCODERS, EXPORT_FORMATS, EXPORT_MIMETYPES
+from .serving import listen_reusing_port, serve_reusing_port
@@ -0,0 +1,170 @@
+import json
+import struct
+
+import numpy as np
+
+from .helpers import js_long_to_date
+
+try:
+    import orjson
+
+    loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    loads = json.loads
+    JSON_BACKEND = 'json'
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# struct frame: magic byte, origin, number of records, then records of int64 timestamp and origin fields
+STRUCT_MAGIC = 0xB5
+STRUCT_HEADER = struct.Struct('<BHH')
+FORMATS = ('json', 'msgpack', 'struct')
+
+
+def build_plan(data: dict, prefix: str = '') -> tuple:
+    """
+    :return: shape plan of data, tuple of (key, flattened key, plan of nested dict or None) for every key
+    """
+    plan = []
+    for key, val in data.items():
+        flat_key = f"{prefix}{key}"
+        if isinstance(val, dict):
+            plan.append((key, flat_key, build_plan(val, f"{flat_key}.")))
+        else:
+            plan.append((key, flat_key, None))
+    return tuple(plan)
+
+
+def apply_plan(plan: tuple, data: dict, ret_dict: dict) -> bool:
+    """
+    Flatten data into ret_dict using keys from plan.
+
+    :return: False if data does not have the shape described by plan
+    """
+    if len(data) != len(plan):
+        return False
+    for key, flat_key, nested_plan in plan:
+        try:
+            val = data[key]
+        except KeyError:
+            return False
+        if nested_plan is None:
+            if isinstance(val, dict):
+                return False
+            ret_dict[flat_key] = val
+        elif not isinstance(val, dict) or not apply_plan(nested_plan, val, ret_dict):
+            return False
+    return True
+
+
+class ShapeFlattener:
+    """
+    Flattens messages like parse_dict, reusing key paths of the previous message of the same origin
+    while messages keep the same shape.
+    """
+
+    def __init__(self):
+        self.plans = {}
+
+    def flatten(self, origin: str, data: dict) -> dict:
+        plan = self.plans.get(origin)
+        if plan is not None:
+            ret_dict = {}
+            if apply_plan(plan, data, ret_dict):
+                return ret_dict
+        plan = build_plan(data)
+        self.plans[origin] = plan
+        ret_dict = {}
+        apply_plan(plan, data, ret_dict)
+        return ret_dict
+
+
+class PayloadDecoder:
+    """
+    Decodes json, msgpack and struct payloads into (origin, timestamp, flattened data) messages.
+
+    Format is taken from topic_formats for known topics and detected from the first byte otherwise.
+    json and msgpack messages have the {"header": {"origin", "timestamp"}, "data"} layout, where timestamp is
+    a js long dict or an integer. Struct frames are described per origin by "struct" in app_config.json,
+    a list of [key, numpy type] pairs, e.g. [["pressure.raw", "<u2"], ["pressure.scaled", "<f4"]].
+    """
+
+    def __init__(self, origins_config: dict = None, topic_formats: dict = None):
+        self.flattener = ShapeFlattener()
+        self.topic_formats = topic_formats or {}
+        for topic, payload_format in self.topic_formats.items():
+            if payload_format not in FORMATS:
+                raise ValueError(f"Unknown format {payload_format} for topic {topic}, available formats: {FORMATS}")
+        self.record_types = {}
+        for origin, origin_config in (origins_config or {}).items():
+            fields = origin_config.get('struct')
+            if fields:
+                self.record_types[origin] = np.dtype([('timestamp', '<i8')] + [(key, kind) for key, kind in fields])
+
+    def detect_format(self, topic: str, payload: bytes) -> str:
+        payload_format = self.topic_formats.get(topic)
+        if payload_format is not None:
+            return payload_format
+        first = payload.lstrip()[:1]
+        if first == b'{':
+            return 'json'
+        if first and first[0] == STRUCT_MAGIC:
+            return 'struct'
+        if first and (0x80 <= first[0] <= 0x8f or first[0] in (0xde, 0xdf)):
+            return 'msgpack'
+        return 'json'
+
+    def decode(self, topic: str, payload: bytes) -> list:
+        """
+        :return: list of (origin, timestamp, flattened data), empty if the message has no header or data
+        """
+        payload_format = self.detect_format(topic, payload)
+        if payload_format == 'struct':
+            return self.decode_struct(payload)
+        if payload_format == 'msgpack':
+            if msgpack is None:
+                raise ValueError("received msgpack payload but msgpack is not installed")
+            message = msgpack.unpackb(payload, strict_map_key=False)
+        else:
+            message = loads(payload)
+        return self.decode_message(message)
+
+    def decode_message(self, message: dict) -> list:
+        header = message.get('header')
+        if not header:
+            return []
+        origin = header.get('origin')
+        data = message.get('data')
+        if data is None or origin is None:
+            return []
+        origin = str(origin)
+
+        timestamp = header.get('timestamp')
+        if timestamp is None:
+            return []
+        if isinstance(timestamp, int):
+            timestamp = timestamp / 10000
+        else:
+            high = timestamp.get('high')
+            low = timestamp.get('low')
+            signed = timestamp.get('unsigned')
+            if high is None or low is None or signed is None:
+                return []
+            timestamp = js_long_to_date(high, low, signed)
+        return [(origin, timestamp, self.flattener.flatten(origin, data))]
+
+    def decode_struct(self, payload: bytes) -> list:
+        _, origin, count = STRUCT_HEADER.unpack_from(payload)
+        origin = str(origin)
+        record_type = self.record_types.get(origin)
+        if record_type is None:
+            raise ValueError(f"no struct layout configured for origin {origin}")
+        records = np.frombuffer(payload, record_type, count, STRUCT_HEADER.size)
+        timestamps = (records['timestamp'] / 10000).tolist()
+        keys = record_type.names[1:]
+        columns = [records[key].tolist() for key in keys]
+        return [(origin, timestamp, dict(zip(keys, values))) for timestamp, *values in zip(timestamps, *columns)]
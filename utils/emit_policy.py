@@ -0,0 +1,96 @@
+from typing import Optional
+
+import numpy as np
+
+
+class EmitPolicy:
+    """
+    Decides which stored samples of an origin are sent to clients. Base policy keeps all samples.
+    """
+    name = 'all'
+
+    def apply(self, timestamps: np.ndarray, values: np.ndarray, indices: np.ndarray):
+        """
+        :param timestamps: sample timestamps, sorted
+        :param values: sample values
+        :param indices: index of every sample in its series since the series was created
+        :return: timestamps and values to send
+        """
+        return timestamps, values
+
+
+class KeepEveryNth(EmitPolicy):
+    name = 'every_nth'
+
+    def __init__(self, n: int = 10):
+        if n <= 0:
+            raise ValueError("n has to be positive")
+        self.n = n
+
+    def apply(self, timestamps, values, indices):
+        # picking by series index keeps the same samples when the window moves
+        keep = indices % self.n == 0
+        return timestamps[keep], values[keep]
+
+
+class TimeBucket(EmitPolicy):
+    name = 'bucket'
+    aggregates = {'mean': np.add, 'min': np.minimum, 'max': np.maximum}
+
+    def __init__(self, interval: float = 0.1, aggregate: str = 'mean'):
+        if interval <= 0:
+            raise ValueError("interval has to be positive")
+        if aggregate not in self.aggregates:
+            raise ValueError(f"Unknown aggregate {aggregate}, available aggregates: {list(self.aggregates)}")
+        self.interval = interval
+        self.aggregate = aggregate
+
+    def buckets(self, timestamps):
+        """
+        :return: bucket numbers and start indexes of buckets in timestamps
+        """
+        bucket_ids = np.floor(timestamps / self.interval)
+        starts = np.flatnonzero(np.diff(bucket_ids)) + 1
+        starts = np.concatenate(([0], starts)).astype(np.intp)
+        return bucket_ids[starts], starts
+
+    def apply(self, timestamps, values, indices):
+        if not len(timestamps):
+            return timestamps, values
+        bucket_ids, starts = self.buckets(timestamps)
+        reduced = self.aggregates[self.aggregate].reduceat(values, starts)
+        if self.aggregate == 'mean':
+            reduced = reduced / np.diff(np.append(starts, len(values)))
+        return bucket_ids * self.interval, reduced
+
+
+class LatestOnly(TimeBucket):
+    name = 'latest'
+
+    def __init__(self, interval: float = 0.1):
+        super().__init__(interval)
+
+    def apply(self, timestamps, values, indices):
+        if not len(timestamps):
+            return timestamps, values
+        _, starts = self.buckets(timestamps)
+        last = np.append(starts[1:] - 1, len(timestamps) - 1)
+        return timestamps[last], values[last]
+
+
+EMIT_POLICIES = {policy.name: policy for policy in [EmitPolicy, KeepEveryNth, TimeBucket, LatestOnly]}
+
+
+def get_emit_policy(config: dict) -> Optional[EmitPolicy]:
+    """
+    :param config: {"policy": name, **policy arguments}, e.g. {"policy": "bucket", "interval": 0.1, "aggregate": "max"}
+    :return: policy, None for all samples, so charts of the origin are still drawn from rollups
+    """
+    config = dict(config)
+    name = config.pop('policy', EmitPolicy.name)
+    policy = EMIT_POLICIES.get(name)
+    if policy is None:
+        raise ValueError(f"Unknown emit policy {name}, available policies: {list(EMIT_POLICIES)}")
+    if policy is EmitPolicy:
+        return None
+    return policy(**config)
@@ -0,0 +1,113 @@
+import json
+import struct
+
+import numpy as np
+
+from .helpers import lttb_indices
+
+EXPORT_FORMATS = ('json', 'csv', 'binary')
+EXPORT_MIMETYPES = {'json': 'application/json', 'csv': 'text/csv', 'binary': 'application/octet-stream'}
+# key length, sample count, followed by the key and float64 timestamps and values
+BINARY_HEADER = struct.Struct('<HI')
+# samples per chunk of streamed output
+CHUNK_SIZE = 10000
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, points: int):
+    """
+    :return: timestamps and values reduced to points with lttb, unchanged if there are not more samples than points
+    """
+    if points <= 0 or len(timestamps) <= points:
+        return timestamps, values
+    indices = lttb_indices(timestamps, values, points)
+    return timestamps[indices], values[indices]
+
+
+def encode_json_array(array: np.ndarray):
+    """
+    :return: generator of chunks of the items of a json array of array, CHUNK_SIZE items each
+    """
+    for first in range(0, len(array), CHUNK_SIZE):
+        yield f'{", " if first else ""}{json.dumps(array[first:first + CHUNK_SIZE].tolist())[1:-1]}'
+
+
+def encode_json(columns):
+    """
+    :param columns: iterable of (key, (timestamps, values))
+    :return: generator of chunks of {key: {'timestamps': [...], 'values': [...]}}
+    """
+    yield '{'
+    for i, (key, (timestamps, values)) in enumerate(columns):
+        yield f'{", " if i else ""}{json.dumps(key)}: {{"timestamps": ['
+        yield from encode_json_array(timestamps)
+        yield '], "values": ['
+        yield from encode_json_array(values)
+        yield ']}'
+    yield '}'
+
+
+def encode_csv(columns):
+    """
+    :param columns: iterable of (key, (timestamps, values))
+    :return: generator of chunks of key,timestamp,value rows with a header row
+    """
+    yield 'key,timestamp,value\n'
+    for key, (timestamps, values) in columns:
+        for first in range(0, len(timestamps), CHUNK_SIZE):
+            rows = zip(timestamps[first:first + CHUNK_SIZE].tolist(), values[first:first + CHUNK_SIZE].tolist())
+            yield ''.join(f'{key},{t!r},{v!r}\n' for t, v in rows)
+
+
+def encode_binary(columns):
+    """
+    :param columns: iterable of (key, (timestamps, values))
+    :return: generator of BINARY_HEADER, utf-8 key, little endian float64 timestamps and values of every key
+    """
+    for key, (timestamps, values) in columns:
+        encoded_key = key.encode()
+        yield BINARY_HEADER.pack(len(encoded_key), len(timestamps)) + encoded_key
+        yield np.ascontiguousarray(timestamps, dtype='<f8').tobytes()
+        yield np.ascontiguousarray(values, dtype='<f8').tobytes()
+
+
+def decode_binary(data: bytes) -> dict:
+    """
+    :return: key -> (timestamps, values) of output of encode_binary
+    """
+    columns = {}
+    offset = 0
+    while offset < len(data):
+        key_length, count = BINARY_HEADER.unpack_from(data, offset)
+        offset += BINARY_HEADER.size
+        key = data[offset:offset + key_length].decode()
+        offset += key_length
+        timestamps = np.frombuffer(data, '<f8', count, offset)
+        offset += timestamps.nbytes
+        values = np.frombuffer(data, '<f8', count, offset)
+        offset += values.nbytes
+        columns[key] = (timestamps, values)
+    return columns
+
+
+ENCODERS = {'json': encode_json, 'csv': encode_csv, 'binary': encode_binary}
+
+
+def dump_data(data: dict):
+    """
+    :return: generator of chunks of all data as {origin: {key: [{'timestamp': t, 'value': v}]}},
+     every series is serialized CHUNK_SIZE samples at a time
+    """
+    yield '{'
+    for i, (origin, origin_data) in enumerate(list(data.items())):
+        yield f'{", " if i else ""}{json.dumps(origin)}: {{'
+        for j, (key, series) in enumerate(list(origin_data.items())):
+            yield f'{", " if j else ""}{json.dumps(key)}: ['
+            # copies, the series may be appended to while it is streamed
+            timestamps, values = series.arrays()
+            for first in range(0, len(timestamps), CHUNK_SIZE):
+                points = [{'timestamp': t, 'value': v} for t, v in
+                          zip(timestamps[first:first + CHUNK_SIZE].tolist(), values[first:first + CHUNK_SIZE].tolist())]
+                yield f'{", " if first else ""}{json.dumps(points)[1:-1]}'
+            yield ']'
+        yield '}'
+    yield '}'
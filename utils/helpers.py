@@ -1,10 +1,12 @@
 import hashlib
 import random
+from collections import deque
 from copy import deepcopy
-from math import sqrt
-from typing import Dict, List
+from itertools import islice
+from math import radians, sin, cos, pi
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from geopy.distance import distance
 
 
@@ -20,9 +22,6 @@ class DataPoint:
         return f"{self.timestamp}: {self.value}"
 
 
-DataType = Dict[str, Dict[str, List[DataPoint]]]
-
-
 def create_session_name(n: int) -> str:
     return hashlib.md5(str(n).encode('utf-8')).hexdigest()[::2] + hashlib.md5(
         str(random.randint(69, 2137)).encode('utf-8')).hexdigest()[::-2]
@@ -85,64 +84,114 @@ def get_data_points(data: list[DataPoint], timestamp: float) -> list[DataPoint]:
         mid = (start + end) // 2
     return data[start:]
 
-window_size=2
+window_size = 2
 
-def filter_points(data: list[DataPoint]) -> list[DataPoint]:
-    if len(data) <= 2*window_size+1:
-        return data
-    ret_data = data[:window_size]
-    points = data[:2*window_size]
-    for i in range(2*window_size, len(data)):
-        points.append(data[i])
-        point = points.pop(window_size)
-        point_values =np.array([p.value for p in points])
-        dev = np.std(point_values) + 1
-        avg = np.average(point_values)
-        if avg-3*dev<point.value<avg+3*dev:
-            ret_data.append(point)
-        points.insert(window_size, point)
-        points = points[1:]
-
-    ret_data.extend(data[-window_size:])
-    return ret_data
 
+def outlier_mask(values) -> np.ndarray:
+    """
+    Mark points that lie within 3 * (std + 1) of the mean of their window_size neighbours on each side.
+    The first and last window_size points are always kept.
 
-def largest_triangle_three_buckets(data, target_count):
-    if target_count >= len(data) or target_count <= 0:
-        return data
+    :param values: array of point values
+    :return: boolean array, True for points that should be kept
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.ones(len(values), dtype=bool)
+    if len(values) <= 2 * window_size + 1:
+        return keep
+    windows = sliding_window_view(values, 2 * window_size + 1)
+    neighbours = np.delete(windows, window_size, axis=1)
+    dev = np.std(neighbours, axis=1) + 1
+    avg = np.mean(neighbours, axis=1)
+    point_values = values[window_size:-window_size]
+    keep[window_size:-window_size] = (avg - 3 * dev < point_values) & (point_values < avg + 3 * dev)
+    return keep
+
+
+def is_kept(value: float, neighbours) -> bool:
+    """
+    outlier_mask of a single point, for filtering samples one at a time.
 
-    bucket_size = (len(data) - 2) / (target_count - 2)
-    reduced_data = [data[0]]  # Always include the first point
+    :param neighbours: values of window_size points on each side of the point
+    :return: True if the point should be kept
+    """
+    count = len(neighbours)
+    avg = sum(neighbours) / count
+    dev = (sum([(x - avg) * (x - avg) for x in neighbours]) / count) ** 0.5 + 1
+    return avg - 3 * dev < value < avg + 3 * dev
 
-    for i in range(1, target_count - 1):
-        # Calculate the range for the current bucket
-        range_start = int(np.floor((i - 1) * bucket_size)) + 1
-        range_end = int(np.floor(i * bucket_size)) + 1
 
-        # Get the average X and Y values for the next bucket
-        next_range_start = int(np.floor(i * bucket_size)) + 1
-        next_range_end = int(np.floor((i + 1) * bucket_size)) + 1
-        next_bucket = data[next_range_start:next_range_end]
-        avg_x = np.mean([p.timestamp for p in next_bucket])
-        avg_y = np.mean([p.value for p in next_bucket])
+def filter_points(data):
+    """
+    :param data: list of DataPoints or array of values
+    :return: data without outliers
+    """
+    if len(data) <= 2 * window_size + 1:
+        return data
+    if isinstance(data, np.ndarray):
+        return data[outlier_mask(data)]
+    keep = outlier_mask([p.value for p in data])
+    return [point for point, kept in zip(data, keep.tolist()) if kept]
 
-        # Find the point with the largest triangle area
-        range_data = data[range_start:range_end]
-        a = data[range_start - 1]
-        max_area = -1
-        chosen_point = None
 
-        for point in range_data:
-            area = abs((a.timestamp - avg_x) * (point.value - a.value) - (a.timestamp - point.timestamp) * (
-                    avg_y - a.value)) / 2
-            if area > max_area:
-                max_area = area
-                chosen_point = point
+def lttb_indices(timestamps, values, target_count) -> np.ndarray:
+    """
+    Pick target_count points with the largest triangle three buckets algorithm. Points of every bucket are compared
+    by the area of the triangle they form with the point preceding the bucket and the average of the next bucket.
 
-        reduced_data.append(chosen_point)
+    :param timestamps: array of point timestamps
+    :param values: array of point values
+    :param target_count: number of points to pick
+    :return: sorted indexes of picked points
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    length = len(timestamps)
+    if target_count >= length or target_count <= 0:
+        return np.arange(length)
+    if target_count <= 2:
+        return np.array([0, length - 1])
+
+    bucket_size = (length - 2) / (target_count - 2)
+    # bounds[i] is where bucket i starts, bucket i spans bounds[i]:bounds[i + 1]
+    bounds = (np.floor(np.arange(target_count) * bucket_size) + 1).astype(np.intp)
+    # the last bucket runs past the end of the data
+    bounds[-1] = length
+    counts = np.diff(bounds)
+
+    next_starts = bounds[1:-1]
+    next_counts = counts[1:]
+    avg_x = np.add.reduceat(timestamps, next_starts) / next_counts
+    avg_y = np.add.reduceat(values, next_starts) / next_counts
+
+    starts = bounds[:-2]
+    a_x = timestamps[starts - 1]
+    a_y = values[starts - 1]
+
+    bucket_counts = counts[:-1]
+    point_x = timestamps[1:bounds[-2]]
+    point_y = values[1:bounds[-2]]
+    a_x, a_y = np.repeat(a_x, bucket_counts), np.repeat(a_y, bucket_counts)
+    avg_x, avg_y = np.repeat(avg_x, bucket_counts), np.repeat(avg_y, bucket_counts)
+    areas = np.abs((a_x - avg_x) * (point_y - a_y) - (a_x - point_x) * (avg_y - a_y)) / 2
+    areas = np.nan_to_num(areas, nan=-1)
+
+    # first point with the largest area in each bucket
+    offsets = starts - 1
+    max_areas = np.maximum.reduceat(areas, offsets)
+    candidates = np.flatnonzero(areas == np.repeat(max_areas, bucket_counts))
+    buckets = np.repeat(np.arange(len(starts)), bucket_counts)[candidates]
+    _, first = np.unique(buckets, return_index=True)
+    chosen = candidates[first] + 1
+
+    return np.concatenate(([0], chosen, [length - 1]))
 
-    reduced_data.append(data[-1])  # Always include the last point
-    return reduced_data
+
+def largest_triangle_three_buckets(data, target_count):
+    if target_count >= len(data) or target_count <= 0:
+        return data
+    indices = lttb_indices([p.timestamp for p in data], [p.value for p in data], target_count)
+    return [data[i] for i in indices.tolist()]
 
 
 def parse_dict(data: dict):
@@ -158,12 +207,90 @@ def parse_dict(data: dict):
     return ret_dict
 
 
-def check_location_difference(location1, location2, resolution=1):
-    coords_1 = (location1.get('lng'), location1.get('lat'))
-    coords_2 = (location2.get('lng'), location2.get('lat'))
+def tail(items, count: int) -> list:
+    """
+    :return: last count items of a list or deque, without copying the whole deque
+    """
+    if isinstance(items, deque):
+        return list(islice(reversed(items), count))[::-1]
+    return list(items[-count:])
+
+
+EARTH_RADIUS = 6371008.8
+DISTANCE_MODES = ('equirectangular', 'haversine', 'geodesic')
+
+
+def is_further_than(lat1, lng1, lat2, lng2, resolution, mode='equirectangular') -> bool:
+    """
+    Check if two points in degrees are more than resolution metres apart.
+
+    :param mode: equirectangular (planar approximation, fine for small distances), haversine or geodesic
+    """
+    if mode == 'geodesic':
+        return distance((lat1, lng1), (lat2, lng2)).m > resolution
+    lat1, lng1, lat2, lng2 = radians(lat1), radians(lng1), radians(lat2), radians(lng2)
+    d_lat = lat2 - lat1
+    d_lng = (lng2 - lng1 + pi) % (2 * pi) - pi
+    if mode == 'haversine':
+        # compare haversine of the central angle instead of taking asin and sqrt of it
+        hav = sin(d_lat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(d_lng / 2) ** 2
+        return hav > sin(resolution / EARTH_RADIUS / 2) ** 2
+    if mode == 'equirectangular':
+        x = d_lng * cos((lat1 + lat2) / 2)
+        return (x * x + d_lat * d_lat) * EARTH_RADIUS ** 2 > resolution * resolution
+    raise ValueError(f"Unknown distance mode {mode}, available modes: {DISTANCE_MODES}")
+
+
+def check_location_difference(location1, location2, resolution=1, mode='equirectangular'):
+    coords_1 = (location1.get('lat'), location1.get('lng'))
+    coords_2 = (location2.get('lat'), location2.get('lng'))
     if None in coords_1 and not None in coords_2:
         return True
     if None in coords_1 or None in coords_2:
         return False
-    dist = distance(coords_2, coords_1).m
-    return dist > resolution
+    return is_further_than(*coords_1, *coords_2, resolution, mode)
+
+
+def decimate_trail(lats, lngs, resolution=1, mode='equirectangular') -> np.ndarray:
+    """
+    Pick trail points that are more than resolution metres away from the previously picked point,
+    the same way trail points are picked from incoming locations.
+
+    :param lats: array of latitudes in degrees
+    :param lngs: array of longitudes in degrees
+    :return: indexes of picked points
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    if not len(lats):
+        return np.array([], dtype=np.intp)
+    if mode == 'geodesic':
+        picked = [0]
+        for i in range(1, len(lats)):
+            if is_further_than(lats[picked[-1]], lngs[picked[-1]], lats[i], lngs[i], resolution, mode):
+                picked.append(i)
+        return np.array(picked)
+    if mode not in DISTANCE_MODES:
+        raise ValueError(f"Unknown distance mode {mode}, available modes: {DISTANCE_MODES}")
+
+    lat_rad = np.radians(lats)
+    lng_rad = np.radians(lngs)
+    cos_lat = np.cos(lat_rad).tolist()
+    lat_rad, lng_rad = lat_rad.tolist(), lng_rad.tolist()
+    angle = resolution / EARTH_RADIUS
+    threshold = sin(angle / 2) ** 2 if mode == 'haversine' else angle * angle
+
+    picked = [0]
+    last = 0
+    for i in range(1, len(lat_rad)):
+        d_lat = lat_rad[i] - lat_rad[last]
+        d_lng = (lng_rad[i] - lng_rad[last] + pi) % (2 * pi) - pi
+        if mode == 'haversine':
+            value = sin(d_lat / 2) ** 2 + cos_lat[last] * cos_lat[i] * sin(d_lng / 2) ** 2
+        else:
+            x = d_lng * cos((lat_rad[i] + lat_rad[last]) / 2)
+            value = x * x + d_lat * d_lat
+        if value > threshold:
+            picked.append(i)
+            last = i
+    return np.array(picked)
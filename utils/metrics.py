@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Counts calls and total and max duration of named processing stages.
+    """
+
+    def __init__(self):
+        # stage -> [count, total duration, max duration]
+        self.stages = {}
+
+    def add(self, stage: str, duration: float, count: int = 1):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = [0, 0.0, 0.0]
+            self.stages[stage] = stats
+        stats[0] += count
+        stats[1] += duration
+        if duration > stats[2]:
+            stats[2] = duration
+
+    @contextmanager
+    def measure(self, stage: str, count: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, count)
+
+    def reset(self):
+        self.stages = {}
+
+    def stats(self):
+        return {stage: {'count': count, 'total': total, 'mean': total / count if count else 0, 'max': max_duration}
+                for stage, (count, total, max_duration) in list(self.stages.items())}
+
+    def report(self) -> str:
+        lines = [f"{'stage':<12}{'count':>10}{'total s':>10}{'mean ms':>10}{'max ms':>10}"]
+        for stage, stats in self.stats().items():
+            lines.append(f"{stage:<12}{stats['count']:>10}{stats['total']:>10.3f}"
+                         f"{stats['mean'] * 1000:>10.3f}{stats['max'] * 1000:>10.3f}")
+        return '\n'.join(lines)
@@ -0,0 +1,40 @@
+import socket
+
+
+def listen_reusing_port(host: str, port: int, backlog: int = 128) -> socket.socket:
+    """
+    :return: listening socket other processes can bind to the same port as well, the kernel balances
+     incoming connections between them
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("Worker processes need SO_REUSEPORT, which this platform does not support")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def serve_reusing_port(app, host: str, port: int, async_mode: str):
+    """
+    Serves the wsgi app on a port shared with other processes until interrupted, with the server of async_mode.
+    """
+    sock = listen_reusing_port(host, port)
+    if async_mode == 'eventlet':
+        import eventlet.wsgi
+
+        eventlet.wsgi.server(sock, app, log_output=False)
+    elif async_mode == 'gevent':
+        from gevent import pywsgi
+        try:
+            from geventwebsocket.handler import WebSocketHandler
+        except ImportError:
+            # websockets come from the simple-websocket package
+            WebSocketHandler = pywsgi.WSGIHandler
+
+        pywsgi.WSGIServer(sock, app, handler_class=WebSocketHandler, log=None).serve_forever()
+    else:
+        from werkzeug.serving import make_server
+
+        make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
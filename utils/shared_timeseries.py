@@ -0,0 +1,151 @@
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+import numpy as np
+
+from .timeseries import TimeSeries
+
+# start, size and total of the series and of each of its rollups follow the sequence number
+STATE_FIELDS = 3
+# names of blocks created by this process, registered with its resource tracker until unlinked
+created_blocks = set()
+
+
+def attach_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    :return: existing shared memory block, left to its creator to unlink
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    memory = shared_memory.SharedMemory(name)
+    # before 3.13 attaching registers the block with the resource tracker of this process, which unlinks it on exit
+    if memory.name not in created_blocks:
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+class SharedTimeSeries(TimeSeries):
+    """
+    TimeSeries with its columns and the columns of its rollups in one shared memory block, written by one process
+    and read without copying by other processes attached to the block by name.
+
+    The writer appends as to any TimeSeries and calls share after every batch, and within batches once needs_share,
+    to publish start, size and total of the series and its rollups. Readers take them over with refresh. The state is written under an odd
+    sequence number, so a reader never takes a half written one.
+
+    The writer keeps guard slots more than capacity in the series and each of its rollups, readers see at most
+    capacity newest samples of the shared state. Once the ring is full the writer overwrites the guard oldest
+    slots first, so readers keep reading the samples of the last shared state while the writer appends up to
+    guard samples after it, and have to refresh before the writer appends more.
+    """
+
+    def __init__(self, capacity: int = 100000, retention: Optional[float] = None, resolutions=(),
+                 rollup_capacity: int = 10000, guard: int = 1000):
+        super().__init__(capacity + guard, retention, resolutions, rollup_capacity + guard)
+        self.guard = guard
+        self.memory = None
+        self._state = np.zeros(0, dtype=np.int64)
+        self.shared_total = 0
+
+    @classmethod
+    def attach(cls, name: str, capacity: int, resolutions=(), rollup_capacity: int = 10000,
+               guard: int = 1000) -> 'SharedTimeSeries':
+        """
+        :return: reader of the series shared by the writer under name, with its current state
+        """
+        series = cls(capacity, None, resolutions, rollup_capacity, guard)
+        series.memory = attach_memory(name)
+        series._map()
+        series.refresh()
+        return series
+
+    @property
+    def name(self) -> Optional[str]:
+        """
+        :return: name of the shared memory block, None until the writer appends the first sample
+        """
+        return self.memory.name if self.memory is not None else None
+
+    def layout(self):
+        """
+        :return: arguments of attach
+        """
+        return (self.name, self.capacity - self.guard, [rollup.resolution for rollup in self.rollups],
+                self.rollup_capacity - self.guard, self.guard)
+
+    def _series(self):
+        return (self, *self.rollups)
+
+    def _allocate(self):
+        state_size = (1 + STATE_FIELDS * len(self._series())) * np.dtype(np.int64).itemsize
+        columns_size = sum(np.dtype(dtype).itemsize * series.capacity
+                           for series in self._series() for _, dtype in series.COLUMNS)
+        self.memory = shared_memory.SharedMemory(create=True, size=state_size + columns_size)
+        created_blocks.add(self.memory.name)
+        self._map()
+
+    def _map(self):
+        offset = 0
+
+        def column(dtype, length):
+            nonlocal offset
+            array = np.ndarray(length, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self._state = column(np.int64, 1 + STATE_FIELDS * len(self._series()))
+        for series in self._series():
+            for name, dtype in series.COLUMNS:
+                setattr(series, name, column(dtype, series.capacity))
+
+    def share(self) -> bool:
+        """
+        Publishes the state of the series and its rollups to readers.
+
+        :return: whether samples were appended since the previous share
+        """
+        if self.memory is None or self.total == self.shared_total:
+            return False
+        state = [value for series in self._series() for value in (series._start, series._size, series.total)]
+        self._state[0] += 1
+        self._state[1:] = state
+        self._state[0] += 1
+        self.shared_total = self.total
+        return True
+
+    def needs_share(self) -> bool:
+        """
+        :return: whether the writer appended guard samples since the previous share, readers have to refresh
+         before it appends more
+        """
+        return self.total - self.shared_total >= self.guard
+
+    def refresh(self):
+        """
+        Takes over the state last shared by the writer.
+        """
+        while True:
+            sequence = int(self._state[0])
+            if sequence % 2 == 0:
+                state = self._state[1:].tolist()
+                if int(self._state[0]) == sequence:
+                    break
+            time.sleep(0)
+        for index, series in enumerate(self._series()):
+            start, size, series.total = state[index * STATE_FIELDS:(index + 1) * STATE_FIELDS]
+            # slots the writer overwrites first
+            hidden = max(size - (series.capacity - self.guard), 0)
+            series._start, series._size = (start + hidden) % series.capacity, size - hidden
+            # the writer keeps the guard slots out of the samples of readers instead
+            series._written = series.total
+            series._publish()
+
+    def unlink(self):
+        """
+        Removes the block once every process closed it, called by the writer.
+        """
+        if self.memory is not None:
+            self.memory.unlink()
+            created_blocks.discard(self.memory.name)
@@ -0,0 +1,285 @@
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+from .helpers import DataPoint, is_kept, window_size
+
+
+class TimeSeries:
+    """
+    Fixed capacity ring buffer of (timestamp, value) samples stored in two float64 columns.
+
+    Samples are expected to be appended in timestamp order. Oldest samples are overwritten once
+    capacity is reached, or dropped once they are older than retention seconds from the newest sample.
+    Indexing and iteration return DataPoint objects, so the series can be used wherever a list[DataPoint] was.
+    Columns are allocated with the first sample, so series of non numeric keys take no space.
+    One thread appends while others read, reads return copies of samples of a single state of the series,
+    so columns stay aligned and are not overwritten afterwards.
+
+    :param resolutions: bucket sizes in seconds of rollups kept next to the samples, they aggregate samples kept
+     by the outlier filter, added to them window_size samples late once the filter can decide on them
+    :param rollup_capacity: number of buckets kept by each rollup
+    """
+
+    # name and dtype of every column of capacity elements
+    COLUMNS = (('_timestamps', np.float64), ('_values', np.float64))
+
+    def __init__(self, capacity: int = 100000, retention: Optional[float] = None, resolutions=(),
+                 rollup_capacity: int = 10000):
+        if capacity <= 0:
+            raise ValueError("Capacity has to be positive")
+        self.capacity = capacity
+        self.retention = retention
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.empty(0, dtype=dtype))
+        self._start = 0
+        self._size = 0
+        # number of samples ever appended, index of the next sample
+        self.total = 0
+        # number of samples written to their slot, one more than total while a sample is appended
+        self._written = 0
+        self._publish()
+        self.rollup_capacity = rollup_capacity
+        self.rollups = [Rollup(resolution, rollup_capacity, retention) for resolution in sorted(resolutions)]
+        # last samples, the middle one is filtered and added to rollups
+        self._pending = deque(maxlen=2 * window_size + 1)
+
+    def _allocate(self):
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.empty(self.capacity, dtype=dtype))
+
+    def _publish(self):
+        # readers take start, size and total in one tuple, so they never see a half updated state
+        self._view = (self._start, self._size, self.total)
+
+    def append(self, timestamp: float, value: float):
+        if not len(self._timestamps):
+            self._allocate()
+        if self.rollups:
+            self._append_rollups(timestamp, value)
+        self._written += 1
+        self._write((self._start + self._size) % self.capacity, timestamp, value)
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+        self.total += 1
+
+        if self.retention is not None:
+            self._drop_older_than(timestamp - self.retention)
+        self._publish()
+
+    def _write(self, position: int, timestamp: float, value: float):
+        self._timestamps[position] = timestamp
+        self._values[position] = value
+
+    def _append_rollups(self, timestamp: float, value: float):
+        pending = self._pending
+        pending.append((timestamp, value))
+        if self.total < window_size:
+            # the first samples are always kept
+            sample = pending[-1]
+        elif len(pending) == pending.maxlen:
+            sample = pending[window_size]
+            neighbours = [v for _, v in pending]
+            del neighbours[window_size]
+            if not is_kept(sample[1], neighbours):
+                return
+        else:
+            return
+        for rollup in self.rollups:
+            rollup.append(*sample)
+
+    def _drop_older_than(self, timestamp: float):
+        while self._size > 1 and self._timestamps[self._start] < timestamp:
+            self._start = (self._start + 1) % self.capacity
+            self._size -= 1
+
+    def __len__(self):
+        return self._view[1]
+
+    def __bool__(self):
+        return self._view[1] > 0
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            timestamps, values = self.arrays()
+            return [DataPoint(t, v) for t, v in zip(timestamps[item].tolist(), values[item].tolist())]
+
+        def select(view):
+            index = item + view[1] if item < 0 else item
+            if not 0 <= index < view[1]:
+                raise IndexError("TimeSeries index out of range")
+            return index, index + 1
+
+        _, _, (timestamps, values) = self._read(('_timestamps', '_values'), select)
+        return DataPoint(float(timestamps[0]), float(values[0]))
+
+    def __iter__(self):
+        timestamps, values = self.arrays()
+        for t, v in zip(timestamps.tolist(), values.tolist()):
+            yield DataPoint(t, v)
+
+    def _ordered(self, column: np.ndarray, view, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        :return: copy of samples start:stop of column in append order, indexes relative to the oldest sample of view
+        """
+        offset, size, _ = view
+        if stop is None:
+            stop = size
+        first = offset + start
+        last = offset + stop
+        if last <= self.capacity:
+            return column[first:last].copy()
+        if first >= self.capacity:
+            return column[first - self.capacity:last - self.capacity].copy()
+        return np.concatenate((column[first:], column[:last - self.capacity]))
+
+    def _read(self, columns, select):
+        """
+        Copies columns of samples picked by select from one view of the series, again from a newer view
+        if the writer overwrote some of them while they were copied.
+
+        :param columns: names of columns
+        :param select: function of the view returning start and stop index of the samples
+        :return: view, start index and copies of columns
+        """
+        while True:
+            view = self._view
+            start, stop = select(view)
+            copies = [self._ordered(getattr(self, name), view, start, stop) for name in columns]
+            # once the ring is full the writer overwrites the oldest samples of the view, including the one
+            # it is writing now
+            overwritten = view[1] + self._written - view[2] - self.capacity
+            if overwritten <= start or stop <= start:
+                return view, start, copies
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._read(('_timestamps',), lambda view: (0, view[1]))[2][0]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._read(('_values',), lambda view: (0, view[1]))[2][0]
+
+    def arrays(self, start: int = 0, stop: Optional[int] = None):
+        """
+        :return: copies of timestamps and values of samples start:stop (indexes relative to the oldest stored sample)
+        """
+        _, _, (timestamps, values) = self._read(('_timestamps', '_values'),
+                                                lambda view: (start, view[1] if stop is None else stop))
+        return timestamps, values
+
+    def bisect(self, timestamp: float, view=None) -> int:
+        """
+        :param view: view of the series to search, the current one by default
+        :return: index of the first stored sample with timestamp greater than timestamp
+        """
+        start, size, _ = self._view if view is None else view
+        if not size:
+            return 0
+        tail = self.capacity - start
+        if size <= tail:
+            return int(np.searchsorted(self._timestamps[start:start + size], timestamp, 'right'))
+        # buffer wraps around, older half is at the end of the array
+        if self._timestamps[self.capacity - 1] > timestamp:
+            return int(np.searchsorted(self._timestamps[start:], timestamp, 'right'))
+        head = size - tail
+        return tail + int(np.searchsorted(self._timestamps[:head], timestamp, 'right'))
+
+    def _between(self, start: float, end: Optional[float]):
+        def select(view):
+            first = self.bisect(start, view)
+            return first, max(first, view[1] if end is None else self.bisect(end, view))
+        return select
+
+    def window(self, start: float, end: Optional[float] = None):
+        """
+        :return: copies of timestamps and values of samples with start < timestamp <= end
+        """
+        _, _, (timestamps, values) = self._read(('_timestamps', '_values'), self._between(start, end))
+        return timestamps, values
+
+    def since(self, timestamp: float, context: int = 0):
+        """
+        :return: index since the series was created of the first returned sample, and copies of timestamps
+         and values of samples after timestamp, at least the last one, with up to context samples before them
+        """
+        def select(view):
+            return max(min(self.bisect(timestamp, view), view[1] - 1) - context, 0), view[1]
+
+        view, first, (timestamps, values) = self._read(('_timestamps', '_values'), select)
+        return view[2] - view[1] + first, timestamps, values
+
+    @property
+    def last_timestamp(self) -> float:
+        return self[-1].timestamp
+
+    def to_list(self) -> list[DataPoint]:
+        return list(self)
+
+    def get_rollup(self, start: float, points: int, min_samples: int = 0) -> Optional['Rollup']:
+        """
+        :return: coarsest rollup with at least points buckets after start, None if samples after start
+         are not more than that or not more than min_samples
+        """
+        view = self._view
+        samples = view[1] - self.bisect(start, view)
+        if samples <= min_samples:
+            return None
+        for rollup in reversed(self.rollups):
+            view = rollup._view
+            buckets = view[1] - rollup.bisect(start, view)
+            if points <= buckets < samples:
+                return rollup
+        return None
+
+
+class Rollup(TimeSeries):
+    """
+    Min, max, mean and count of samples in consecutive buckets of resolution seconds, updated on every append.
+    Timestamps are bucket starts and values are bucket means, the last bucket is still open.
+    """
+
+    COLUMNS = TimeSeries.COLUMNS + (('_mins', np.float64), ('_maxs', np.float64), ('_sums', np.float64),
+                                    ('_counts', np.int64))
+
+    def __init__(self, resolution: float, capacity: int = 10000, retention: Optional[float] = None):
+        super().__init__(capacity, retention)
+        if resolution <= 0:
+            raise ValueError("Resolution has to be positive")
+        self.resolution = resolution
+
+    def append(self, timestamp: float, value: float):
+        bucket = timestamp // self.resolution * self.resolution
+        if self._size:
+            last = (self._start + self._size - 1) % self.capacity
+            if self._timestamps[last] == bucket:
+                if value < self._mins[last]:
+                    self._mins[last] = value
+                if value > self._maxs[last]:
+                    self._maxs[last] = value
+                self._sums[last] += value
+                self._counts[last] += 1
+                self._values[last] = self._sums[last] / self._counts[last]
+                return
+        super().append(bucket, value)
+
+    def _write(self, position: int, timestamp: float, value: float):
+        super()._write(position, timestamp, value)
+        self._mins[position] = value
+        self._maxs[position] = value
+        self._sums[position] = value
+        self._counts[position] = 1
+
+    def window_stats(self, start: float, end: Optional[float] = None):
+        """
+        :return: timestamps, mins, maxs, means and counts of buckets with start < bucket start <= end
+        """
+        _, _, (timestamps, mins, maxs, means, counts) = self._read(
+            ('_timestamps', '_mins', '_maxs', '_values', '_counts'), self._between(start, end))
+        return {'timestamps': timestamps, 'min': mins, 'max': maxs, 'mean': means, 'count': counts}
+
+
+DataType = Dict[str, Dict[str, TimeSeries]]